@@ -0,0 +1,190 @@
+"""
+Throughput benchmark for the streaming acquisition path, run against SimulatedDriver (no scope needed).
+
+Every combination of driver block size (sizeOfOneBuffer), channel set and output format is recorded end to end
+through DataAcquisition.start_recording/stop_recording with the simulator delivering a full buffer on every poll.
+For each run the benchmark reports samples/s, output bytes/s, the rates streaming_callback and the output
+writer (conversion and sink writes on the writer thread) each sustain on their own, and the peak RSS of the
+process. Acquisition warnings are still logged; --verbose also shows the informational messages.
+
+    python benchmark.py
+    python benchmark.py --block-sizes 10000,100000 --channels A,ABCD --digital 0,16 --formats csv,raw
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json --max-regression 0.2   # exit code 1 on a regression
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+
+from data_acquisition import DataAcquisition, OUTPUT_FORMATS
+from scope_driver import SimulatedDriver
+
+OUTPUT_EXTENSIONS = {"csv": ".csv", "raw": ".bin"}
+
+
+class PeakRssSampler(threading.Thread):
+    """Samples the resident set size of this process in the background and keeps the peak."""
+    def __init__(self, interval=0.02):
+        super().__init__(name="PeakRssSampler", daemon=True)
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = self.process.memory_info().rss
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+        return self.peak
+
+
+def case_name(block_size, channels, digital, output_format):
+    name = f"{output_format}/{''.join(channels)}"
+    if digital:
+        name += f"+D0-D{digital - 1}"
+    return f"{name}/block{block_size}"
+
+
+def run_case(block_size, channels, digital, output_format, total_samples, directory):
+    """Record total_samples through the full pipeline and return the measurements."""
+    driver = SimulatedDriver(realtime=False)
+    acquisition = DataAcquisition(driver)
+    for ch in channels:
+        acquisition.set_voltage_range(ch, driver.ps_RANGE["PS3000A_5V"], 0.0)
+
+    # Time spent inside the driver callback, the part that must keep up with the scope
+    callback_seconds = [0.0]
+    streaming_callback = acquisition.streaming_callback
+
+    def timed_callback(*args):
+        started = time.perf_counter()
+        streaming_callback(*args)
+        callback_seconds[0] += time.perf_counter() - started
+
+    acquisition.streaming_callback = timed_callback
+
+    filename = os.path.join(directory, "benchmark" + OUTPUT_EXTENSIONS.get(output_format, ".out"))
+    num_buffers = max(1, total_samples // block_size)
+    sampler = PeakRssSampler()
+    sampler.start()
+    started = time.perf_counter()
+    acquisition.start_recording(sizeOfOneBuffer=block_size, numBuffersToCapture=num_buffers, filename=filename,
+                                time_unit="us", sample_interval=1,
+                                channels={ch: ch in channels for ch in "ABCD"},
+                                digital_channels=list(range(digital)) or None, output_format=output_format)
+    acquisition.stop_recording()
+    elapsed = time.perf_counter() - started
+    peak_rss = sampler.stop()
+    # Time the writer thread spent converting and writing blocks, the part that must keep up with the callback
+    writer_seconds = acquisition.stats.snapshot()["write_busy_s"]
+
+    samples = driver.samples_delivered
+    output_bytes = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+    for f in os.listdir(directory):
+        os.remove(os.path.join(directory, f))
+    return {
+        "samples": samples,
+        "seconds": elapsed,
+        "samples_per_s": samples / elapsed,
+        "bytes_per_s": output_bytes / elapsed,
+        "output_bytes": output_bytes,
+        "callback_seconds": callback_seconds[0],
+        "callback_samples_per_s": samples / callback_seconds[0] if callback_seconds[0] else float("inf"),
+        "writer_seconds": writer_seconds,
+        "writer_samples_per_s": samples / writer_seconds if writer_seconds else float("inf"),
+        "peak_rss_mb": peak_rss / 2**20,
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Return a message for every case whose throughput dropped more than max_regression below the baseline."""
+    failures = []
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            continue
+        floor = reference["samples_per_s"] * (1.0 - max_regression)
+        if result["samples_per_s"] < floor:
+            failures.append(f"{name}: {result['samples_per_s']:,.0f} S/s is below {floor:,.0f} S/s "
+                            f"(baseline {reference['samples_per_s']:,.0f} S/s)")
+    return failures
+
+
+def parse_list(text, convert=str):
+    return [convert(item.strip()) for item in text.split(",") if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the streaming acquisition path with a simulated scope.")
+    parser.add_argument("--block-sizes", default="1000,10000,100000", help="sizeOfOneBuffer values to try")
+    parser.add_argument("--channels", default="A,ABCD", help="analog channel sets to try, e.g. A,AB,ABCD")
+    parser.add_argument("--digital", default="0,16", help="number of digital lines (D0..Dn-1) to try, 0 for none")
+    parser.add_argument("--formats", default=",".join(OUTPUT_FORMATS), help="output formats to try")
+    parser.add_argument("--samples", type=int, default=1000000, help="samples recorded per case")
+    parser.add_argument("--json", help="write all results to this file")
+    parser.add_argument("--save-baseline", help="write the results as a baseline file")
+    parser.add_argument("--baseline", help="compare against a baseline file and fail on regressions")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed fractional drop in samples/s against the baseline (default 0.2)")
+    parser.add_argument("--min-rate", type=float, help="fail if any case sustains fewer samples/s than this")
+    parser.add_argument("--verbose", action="store_true", help="also show informational acquisition messages")
+    args = parser.parse_args(argv)
+
+    # Keep the per-recording messages out of the report, but not the warnings
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(levelname)s: %(message)s")
+
+    results = {}
+    print(f"{'case':<36} {'MS/s':>8} {'MB/s':>8} {'cb MS/s':>9} {'wr MS/s':>9} {'RSS MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for output_format in parse_list(args.formats):
+            for channels in parse_list(args.channels):
+                for digital in parse_list(args.digital, int):
+                    for block_size in parse_list(args.block_sizes, int):
+                        name = case_name(block_size, list(channels), digital, output_format)
+                        result = run_case(block_size, list(channels), digital, output_format, args.samples,
+                                          directory)
+                        results[name] = result
+                        print(f"{name:<36} {result['samples_per_s'] / 1e6:>8.3f} "
+                              f"{result['bytes_per_s'] / 2**20:>8.1f} "
+                              f"{result['callback_samples_per_s'] / 1e6:>9.1f} "
+                              f"{result['writer_samples_per_s'] / 1e6:>9.1f} {result['peak_rss_mb']:>8.1f}")
+
+    report = {
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpu_count": os.cpu_count()},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += compare(results, json.load(f), args.max_regression)
+    if args.min_rate is not None:
+        failures += [f"{name}: {result['samples_per_s']:,.0f} S/s is below --min-rate {args.min_rate:,.0f} S/s"
+                     for name, result in results.items() if result["samples_per_s"] < args.min_rate]
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import numpy as np
+
+# Reversible transforms applied to a block of records before it is compressed. Each one first splits the records
+# into one plane per field and takes the difference to the previous sample (zigzag-encoded for the signed analog
+# fields, XOR for the digital port words), then regroups the bytes or bits of those differences.
+FILTERS = ("byteshuffle", "bitshuffle")
+
+
+def _delta_planes(records):
+    """Per-field first differences as a (fields, n) uint16 array. Each block starts from its own first sample,
+    so every frame decodes on its own.
+    """
+    planes = np.empty((len(records.dtype.names), len(records)), dtype=np.uint16)
+    if len(records) == 0:
+        return planes
+    for row, name in enumerate(records.dtype.names):
+        values = records[name].view(np.uint16)
+        plane = planes[row]
+        if records.dtype.fields[name][0].kind == "i":
+            # Signed samples: modular difference, then zigzag so small steps either way become small numbers
+            plane[0] = values[0]
+            np.subtract(values[1:], values[:-1], out=plane[1:])
+            signed = plane.view(np.int16)
+            np.bitwise_xor(signed << 1, signed >> 15, out=signed)
+        else:
+            # Bit fields (digital ports): XOR with the previous word leaves only the lines that changed
+            plane[0] = values[0]
+            np.bitwise_xor(values[1:], values[:-1], out=plane[1:])
+    return planes
+
+
+def _undo_delta(planes, dtype):
+    records = np.zeros(planes.shape[1], dtype=dtype)
+    for row, name in enumerate(dtype.names):
+        plane = planes[row]
+        if dtype.fields[name][0].kind == "i":
+            plane = (plane >> 1) ^ np.negative(plane & 1)
+            values = np.cumsum(plane, dtype=np.uint16)
+        else:
+            values = np.bitwise_xor.accumulate(plane)
+        records[name] = values.view(dtype.fields[name][0])
+    return records
+
+
+def encoded_size(num_records, dtype, shuffle):
+    """Size in bytes of encode_records' output for num_records records."""
+    fields = len(dtype.names)
+    if shuffle == "bitshuffle":
+        return fields * 16 * ((num_records + 7) // 8)
+    return fields * 2 * num_records
+
+
+def encode_records(records, shuffle="bitshuffle"):
+    """Delta + zigzag encode a structured array of 16-bit fields, then byte- or bit-shuffle it. Returns bytes."""
+    if shuffle not in FILTERS:
+        raise ValueError(f"Unknown block filter '{shuffle}', expected one of {FILTERS}")
+    planes = _delta_planes(records)
+    if shuffle == "byteshuffle":
+        # All low bytes of a field, then all its high bytes
+        return planes.view(np.uint8).reshape(len(planes), -1, 2).transpose(0, 2, 1).tobytes()
+    # One packed bit plane per bit of every field; the high planes of small differences are all zero
+    out = []
+    for plane in planes:
+        for bit in range(16):
+            out.append(np.packbits(((plane >> bit) & 1).astype(np.uint8)).tobytes())
+    return b"".join(out)
+
+
+def decode_records(data, dtype, num_records, shuffle="bitshuffle"):
+    """Inverse of encode_records: rebuild num_records records of `dtype` from the encoded bytes."""
+    if shuffle not in FILTERS:
+        raise ValueError(f"Unknown block filter '{shuffle}', expected one of {FILTERS}")
+    fields = len(dtype.names)
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    if shuffle == "byteshuffle":
+        planes = encoded.reshape(fields, 2, num_records).transpose(0, 2, 1).copy().view(np.uint16)
+        planes = planes.reshape(fields, num_records)
+    else:
+        plane_bytes = (num_records + 7) // 8
+        bit_planes = encoded.reshape(fields, 16, plane_bytes)
+        planes = np.zeros((fields, num_records), dtype=np.uint16)
+        for row in range(fields):
+            for bit in range(16):
+                bits = np.unpackbits(bit_planes[row, bit], count=num_records).astype(np.uint16)
+                planes[row] |= bits << bit
+    return _undo_delta(planes, dtype)
@@ -0,0 +1,111 @@
+import csv
+import json
+import os
+import threading
+from collections import deque
+import numpy as np
+
+from raw_capture import sidecar_path
+from segments import manifest_path
+
+BLOCK_HEADER = ["First Sample", "Samples", "Host Time (s)"]
+
+
+def blocks_path(filename):
+    """Path of the block timestamp file that accompanies a capture."""
+    return os.path.splitext(filename)[0] + ".blocks.csv"
+
+
+class BlockTimeLog:
+    """Records, for every block the driver delivers, its first sample index, its length and the host clock
+    (seconds since the start of streaming, from time.perf_counter) at the callback.
+
+    record() only appends to an in-memory queue, so it is cheap enough for the driver callback; flush() writes
+    the queued rows and is called from the polling loop and at close. Together with the start time in the
+    capture metadata this is enough to derive sample times on read (see sample_clock_times) and to compare the
+    scope's clock with the host's over long recordings.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.blocks = 0
+        self._pending = deque()
+        self._lock = threading.Lock()  # flush() may run from the poll loop and from close at the same time
+        self.blockfile = open(filename, mode='w', newline='')
+        self.csvwriter = csv.writer(self.blockfile)
+        self.csvwriter.writerow(BLOCK_HEADER)
+
+    def record(self, first_sample, count, host_time):
+        self._pending.append((first_sample, count, round(host_time, 6)))
+
+    def flush(self):
+        with self._lock:
+            if not self.blockfile:
+                return
+            rows = []
+            while self._pending:
+                rows.append(self._pending.popleft())
+            if rows:
+                self.csvwriter.writerows(rows)
+                self.blockfile.flush()
+                self.blocks += len(rows)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self.blockfile:
+                self.blockfile.close()
+                self.blockfile = None
+                self.csvwriter = None
+
+
+def read_capture_metadata(filename):
+    """Load the capture metadata of a raw or CSV capture from its .json sidecar, or from the manifest of a
+    segmented recording. The capture, its .blocks.csv or its .json path may be given.
+    """
+    if filename.endswith(".blocks.csv"):
+        filename = filename[:-len(".blocks.csv")]
+    if os.path.exists(sidecar_path(filename)):
+        with open(sidecar_path(filename)) as f:
+            return json.load(f)
+    if os.path.exists(manifest_path(filename)):
+        with open(manifest_path(filename)) as f:
+            return json.load(f)["metadata"]
+    raise FileNotFoundError(f"No capture metadata found for {filename}")
+
+
+def read_block_times(filename):
+    """Load a block timestamp file (the capture path may be given instead).
+    Returns (first_samples, counts, host_times) as arrays.
+    """
+    if not filename.endswith(".blocks.csv"):
+        filename = blocks_path(filename)
+    data = np.loadtxt(filename, delimiter=",", skiprows=1, ndmin=2)
+    if data.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2]
+
+
+def sample_clock_times(indexes, metadata):
+    """Wall-clock times of the given sample indexes as numpy datetime64[ns], from the capture's start time and
+    sample interval. metadata is the capture metadata, or the path of a capture to read it from (see
+    read_capture_metadata). Integer nanoseconds throughout, so the times stay exact over multi-day recordings.
+    """
+    if isinstance(metadata, (str, os.PathLike)):
+        metadata = read_capture_metadata(os.fspath(metadata))
+    start_ns = int(metadata["start_time_ns"])
+    indexes = np.asarray(indexes, dtype=np.int64)
+    return (start_ns + indexes * int(metadata["sample_interval_ns"])).astype("datetime64[ns]")
+
+
+def clock_drift(filename, metadata=None):
+    """Host clock minus scope clock (seconds) at every block: how far the host's idea of elapsed time
+    has moved away from sample index * sample interval. Returns (first_samples, drift). The values include the
+    delay between a block being captured and the callback that delivers it. metadata is read from the capture's
+    sidecar or manifest when not given.
+    """
+    if metadata is None:
+        metadata = read_capture_metadata(filename)
+    first_samples, counts, host_times = read_block_times(filename)
+    # The host time is taken when the block arrives, i.e. after its last sample
+    scope_times = (first_samples + counts) * (metadata["sample_interval_ns"] * 1e-9)
+    return first_samples, host_times - scope_times
@@ -0,0 +1,66 @@
+import math
+
+# Aim for this many driver callbacks per second when the buffer size is chosen automatically
+TARGET_CALLBACK_HZ = 20.0
+
+# Driver buffer (sizeOfOneBuffer) limits, in samples per channel
+MIN_BUFFER_SAMPLES = 256
+MAX_BUFFER_SAMPLES = 10_000_000
+
+# Memory caps: all driver buffers together, and the whole ring between callback and writer
+MAX_DRIVER_BUFFER_BYTES = 64 * 2**20
+MAX_RING_BYTES = 512 * 2**20
+
+# Warn when the interval the driver actually samples at puts an automatic buffer size off by more than this factor
+AUTO_SIZE_TOLERANCE = 4.0
+
+# The ring should absorb this many seconds of writer stalls, within these block counts
+RING_SECONDS = 2.0
+MIN_RING_BLOCKS = 4
+MAX_RING_BLOCKS = 256
+
+
+def bytes_per_sample(num_analog, num_digital_ports):
+    """Bytes one sample occupies across all enabled sources (int16 analog, uint16 digital ports)."""
+    return 2 * (num_analog + num_digital_ports)
+
+
+def choose_buffer_size(sample_interval_ns, num_analog, num_digital_ports=0, target_callback_hz=TARGET_CALLBACK_HZ):
+    """Pick sizeOfOneBuffer so that the driver fills one buffer about target_callback_hz times per second.
+
+    Slow captures get the minimum size (a callback per poll is cheap there), fast captures are capped so the driver
+    buffers of all enabled channels stay under MAX_DRIVER_BUFFER_BYTES.
+    """
+    sample_rate = 1e9 / max(1, sample_interval_ns)
+    size = int(sample_rate / target_callback_hz)
+    size = max(MIN_BUFFER_SAMPLES, min(MAX_BUFFER_SAMPLES, size))
+    per_sample = bytes_per_sample(num_analog, num_digital_ports)
+    if per_sample:
+        size = min(size, max(MIN_BUFFER_SAMPLES, MAX_DRIVER_BUFFER_BYTES // per_sample))
+    # Keep block copies on whole cache lines of int16
+    return max(MIN_BUFFER_SAMPLES, size - size % 32)
+
+
+def choose_ring_blocks(buffer_size, sample_interval_ns, num_analog, num_digital_ports=0):
+    """Pick the number of ring blocks so the ring covers about RING_SECONDS of data within MAX_RING_BYTES."""
+    buffer_seconds = buffer_size * max(1, sample_interval_ns) * 1e-9
+    blocks = math.ceil(RING_SECONDS / buffer_seconds)
+    block_bytes = buffer_size * bytes_per_sample(num_analog, num_digital_ports)
+    if block_bytes:
+        blocks = min(blocks, MAX_RING_BYTES // block_bytes)
+    return max(MIN_RING_BLOCKS, min(MAX_RING_BLOCKS, blocks))
+
+
+def size_error(buffer_size, sample_interval_ns, num_analog, num_digital_ports=0,
+               target_callback_hz=TARGET_CALLBACK_HZ):
+    """How far buffer_size is from what choose_buffer_size picks for sample_interval_ns, as a factor of at least 1.
+    Returns (factor, the size choose_buffer_size would pick).
+    """
+    ideal = choose_buffer_size(sample_interval_ns, num_analog, num_digital_ports, target_callback_hz)
+    return max(buffer_size, ideal) / min(buffer_size, ideal), ideal
+
+
+def auto_size(sample_interval_ns, num_analog, num_digital_ports=0, target_callback_hz=TARGET_CALLBACK_HZ):
+    """Return (sizeOfOneBuffer, ring_blocks) for the given capture settings."""
+    size = choose_buffer_size(sample_interval_ns, num_analog, num_digital_ports, target_callback_hz)
+    return size, choose_ring_blocks(size, sample_interval_ns, num_analog, num_digital_ports)
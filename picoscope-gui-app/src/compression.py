@@ -0,0 +1,242 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from raw_capture import RawSink
+from block_filter import FILTERS, decode_records, encode_records, encoded_size
+
+# Optional faster codecs; zlib (deflate, the algorithm behind gzip) is always available
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Tried in this order when the codec is "auto"
+CODEC_PREFERENCE = ("zstd", "lz4", "zlib")
+DEFAULT_LEVELS = {"zstd": 3, "lz4": 0, "zlib": 1}
+
+# Every compressed block is stored as one frame: header, then the compressed bytes
+FRAME_MAGIC = b"PSFR"
+FRAME_HEADER = struct.Struct("<4sIIQ")  # magic, uncompressed size, compressed size, index of the first record
+FRAMING_NAME = "frames-v1"
+
+
+class Codec:
+    """A named compress/decompress pair. compress() may be called from several threads at once."""
+    def __init__(self, name, level=None):
+        if name == "gzip":
+            name = "zlib"
+        if name not in CODEC_PREFERENCE:
+            raise ValueError(f"Unknown codec '{name}', expected one of {CODEC_PREFERENCE}")
+        if name == "zstd" and zstandard is None:
+            raise ValueError("The zstd codec needs the 'zstandard' package")
+        if name == "lz4" and lz4 is None:
+            raise ValueError("The lz4 codec needs the 'lz4' package")
+        self.name = name
+        self.level = DEFAULT_LEVELS[name] if level is None else level
+        self._local = threading.local()  # zstd (de)compressor objects must not be shared between threads
+
+    def compress(self, data):
+        if self.name == "zstd":
+            compressor = getattr(self._local, "compressor", None)
+            if compressor is None:
+                compressor = self._local.compressor = zstandard.ZstdCompressor(level=self.level)
+            return compressor.compress(data)
+        if self.name == "lz4":
+            return lz4.frame.compress(data, compression_level=self.level)
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data, size):
+        if self.name == "zstd":
+            decompressor = getattr(self._local, "decompressor", None)
+            if decompressor is None:
+                decompressor = self._local.decompressor = zstandard.ZstdDecompressor()
+            return decompressor.decompress(data, max_output_size=size)
+        if self.name == "lz4":
+            return lz4.frame.decompress(data)
+        return zlib.decompress(data)
+
+
+def available_codecs():
+    """Codecs that can be used in this environment, fastest first."""
+    return [name for name, module in zip(CODEC_PREFERENCE, (zstandard, lz4, zlib)) if module is not None]
+
+
+def get_codec(name="auto", level=None):
+    """Codec by name; "auto" picks zstd, then lz4, then zlib, whichever is installed first."""
+    if name in (None, "auto"):
+        name = available_codecs()[0]
+    return Codec(name, level)
+
+
+class CompressedRawSink(RawSink):
+    """RawSink that compresses each block into its own frame before it reaches the disk.
+
+    Compression runs on a small thread pool (zlib, zstd and lz4 release the GIL), so several blocks are compressed
+    at once while the writer thread keeps frames in order on disk. Every frame carries its record range, so a
+    reader only decompresses the frames it needs (see CompressedCapture). Compression totals are published
+    to `stats` (telemetry.AcquisitionStats) under "compression".
+    block_filter: "bitshuffle" or "byteshuffle" to delta-encode and shuffle each block first (see block_filter),
+    None to compress the interleaved records as they are.
+    """
+    def __init__(self, filename, analog_channels, digital_ports, block_size, with_min=False, codec="auto",
+                 level=None, threads=2, stats=None, block_filter="bitshuffle"):
+        if block_filter is not None and block_filter not in FILTERS:
+            raise ValueError(f"Unknown block filter '{block_filter}', expected one of {FILTERS}")
+        super().__init__(filename, analog_channels, digital_ports, block_size, with_min)
+        self.codec = get_codec(codec, level)
+        self.block_filter = block_filter
+        self.stats = stats
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.frames = 0
+        self.cpu_seconds = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="Compressor")
+        self._pending = deque()
+        self._max_pending = max(2, threads * 2)
+
+    def compression_metadata(self):
+        return {"codec": self.codec.name, "level": self.codec.level, "framing": FRAMING_NAME,
+                "filter": self.block_filter}
+
+    def _write_sidecar(self):
+        self.metadata["compression"] = self.compression_metadata()
+        super()._write_sidecar()
+
+    def _compress_frame(self, first_record, records):
+        started = time.thread_time()
+        if self.block_filter:
+            data = encode_records(records, self.block_filter)
+        else:
+            data = records.tobytes()
+        compressed = self.codec.compress(data)
+        elapsed = time.thread_time() - started
+        with self._lock:
+            self.cpu_seconds += elapsed
+        # The header keeps the record size, the filter is described once in the sidecar
+        return FRAME_HEADER.pack(FRAME_MAGIC, records.nbytes, len(compressed), first_record) + compressed
+
+    def write_block(self, block):
+        records = self._interleave(block)
+        # Copy, so the record buffer can be reused while the frame is compressed
+        future = self._executor.submit(self._compress_frame, self.samples_written, records.copy())
+        self._pending.append((records.nbytes, future))
+        self.samples_written += block.count
+        while len(self._pending) >= self._max_pending:
+            self._write_next_frame()
+
+    def _write_next_frame(self):
+        raw_size, future = self._pending.popleft()
+        frame = future.result()
+        self.rawfile.write(frame)
+        self.frames += 1
+        self.raw_bytes += raw_size
+        self.compressed_bytes += len(frame)
+        self.bytes_written = self.compressed_bytes
+        if self.stats is not None:
+            self.stats.set_extra("compression", self.metrics())
+
+    def metrics(self):
+        return {
+            "codec": self.codec.name,
+            "frames": self.frames,
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "ratio": self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 0.0,
+            "cpu_s": self.cpu_seconds,
+        }
+
+    def close(self):
+        if self.rawfile:
+            try:
+                while self._pending:
+                    self._write_next_frame()
+            finally:
+                self._executor.shutdown(wait=True)
+        super().close()
+
+
+def scan_frames(data_file):
+    """Read the frame headers of a compressed capture. Returns a list of
+    (file offset of the compressed bytes, first record, uncompressed size, compressed size).
+    A frame cut short at the end of the file (capture still running or interrupted) is left out.
+    """
+    frames = []
+    file_size = os.path.getsize(data_file)
+    with open(data_file, "rb") as f:
+        offset = 0
+        while offset + FRAME_HEADER.size <= file_size:
+            f.seek(offset)
+            magic, raw_size, compressed_size, first_record = FRAME_HEADER.unpack(f.read(FRAME_HEADER.size))
+            if magic != FRAME_MAGIC:
+                raise ValueError(f"Corrupt frame header at offset {offset} in {data_file}")
+            data_offset = offset + FRAME_HEADER.size
+            if data_offset + compressed_size > file_size:
+                break
+            frames.append((data_offset, first_record, raw_size, compressed_size))
+            offset = data_offset + compressed_size
+    return frames
+
+
+class CompressedCapture:
+    """Read-only, array-like view of a compressed capture: len(), dtype and slicing ([start:stop:step] or a
+    single index) decompress only the frames that overlap the requested records.
+    """
+    def __init__(self, data_file, dtype, codec_name, block_filter=None, frames=None):
+        self.data_file = data_file
+        self.dtype = dtype
+        self.codec = get_codec(codec_name)
+        self.block_filter = block_filter
+        # frames: the scan_frames index, if the caller already has it
+        self.frames = scan_frames(data_file) if frames is None else frames
+        self._starts = np.array([frame[1] for frame in self.frames], dtype=np.int64)
+        self._length = 0
+        if self.frames:
+            last = self.frames[-1]
+            self._length = last[1] + last[2] // dtype.itemsize
+
+    def __len__(self):
+        return self._length
+
+    def read(self, start, stop):
+        """Records [start, stop) as a structured array."""
+        start = max(0, start)
+        stop = min(stop, self._length)
+        out = np.zeros(max(0, stop - start), dtype=self.dtype)
+        if stop <= start:
+            return out
+        first_frame = max(0, int(np.searchsorted(self._starts, start, side="right")) - 1)
+        with open(self.data_file, "rb") as f:
+            for data_offset, first_record, raw_size, compressed_size in self.frames[first_frame:]:
+                if first_record >= stop:
+                    break
+                f.seek(data_offset)
+                records = self._decode(f.read(compressed_size), raw_size // self.dtype.itemsize)
+                lo = max(start, first_record)
+                hi = min(stop, first_record + len(records))
+                out[lo - start:hi - start] = records[lo - first_record:hi - first_record]
+        return out
+
+    def _decode(self, compressed, num_records):
+        if self.block_filter:
+            data = self.codec.decompress(compressed, encoded_size(num_records, self.dtype, self.block_filter))
+            return decode_records(data, self.dtype, num_records, self.block_filter)
+        return np.frombuffer(self.codec.decompress(compressed, num_records * self.dtype.itemsize), dtype=self.dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._length)
+            return self.read(start, stop)[::step]
+        if key < 0:
+            key += self._length
+        return self.read(key, key + 1)[0]
@@ -0,0 +1,248 @@
+"""
+Convert a raw capture (.bin + .json sidecar written with output_format="raw") to CSV in millivolts.
+
+The capture is split into chunks which are converted in parallel on a ProcessPoolExecutor; the resulting CSV
+pieces are written out in order, so the output is identical to a single-process conversion. The frame index of a
+compressed capture and the digital events are read once and handed to each worker when it starts.
+
+    python convert_raw.py capture.bin -o capture.csv --channels A,C --digital 0,1 --decimate 10
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from raw_capture import open_capture, read_metadata
+from scaling import ChannelScale
+from csv_encoder import MAX_DECIMALS, encode_rows, sample_times_fixed, scale_decimals, time_decimals, to_fixed
+from digital import channel_mask, combine_ports, unpack_bits, unpack_bits_min_max
+from digital_events import expand_events, read_events
+
+DEFAULT_CHUNK_SAMPLES = 1000000
+
+# Capture opened once per worker process by _init_worker: data, metadata and events
+_worker = {}
+
+# Digital column layouts the converter can write (transitions are only recorded, never produced here)
+CSV_DIGITAL_FORMATS = ("bits", "word")
+
+
+def csv_header(options):
+    header = []
+    if options["time_column"]:
+        header.append(f'Time ({options["time_unit"]})')
+    for ch in options["channels"]:
+        if options["aggregate"]:
+            header.append(f'Channel {ch} min (mV)')
+            header.append(f'Channel {ch} max (mV)')
+        else:
+            header.append(f'Channel {ch} (mV)')
+    if options["digital"] and options["digital_format"] == "word":
+        if options["digital_min"]:
+            header.append('Digital min (D15-D0)')
+            header.append('Digital max (D15-D0)')
+        else:
+            header.append('Digital (D15-D0)')
+    else:
+        for dch in options["digital"]:
+            if options["digital_min"]:
+                header.append(f'D{dch} min')
+                header.append(f'D{dch} max')
+            else:
+                header.append(f'D{dch}')
+    return header
+
+
+def _init_worker(filename, frames, events):
+    """ProcessPoolExecutor initializer: open the capture once (from the frame index scanned by the parent)."""
+    data, metadata = open_capture(filename, frames=frames)
+    _worker.update(data=data, metadata=metadata, events=events)
+
+
+def _convert_worker_chunk(options, start, stop):
+    return convert_chunk(_worker["data"], _worker["metadata"], options, start, stop, _worker["events"])
+
+
+def convert_chunk(data, metadata, options, start, stop, events=None):
+    """Convert samples [start, stop) of an opened raw capture to CSV text (without header).
+    events is the (sample indexes, words) of the digital events file, for captures which recorded transitions only.
+    """
+    step = options["decimate"]
+    records = data[start:stop:step]
+    count = len(records)
+    # Segments of a split recording carry on the sample index of the segment before
+    first = metadata.get("first_sample", 0) + start
+
+    columns = []
+    decimals = []
+    if options["time_column"]:
+        places = time_decimals(metadata["sample_interval_ns"], options["time_unit"])
+        columns.append(sample_times_fixed(first, count, metadata["sample_interval_ns"], options["time_unit"], places,
+                                          step))
+        decimals.append(places)
+    for ch in options["channels"]:
+        channel = metadata["channels"][ch]
+        scale = ChannelScale.for_range(channel["range"], metadata["max_adc"], channel.get("analogue_offset_v", 0.0))
+        places = scale_decimals(scale) if options["precision"] is None else options["precision"]
+        if options["aggregate"]:
+            columns.append(to_fixed(scale.convert(records[f"{ch}_min"]), places))
+            decimals.append(places)
+        columns.append(to_fixed(scale.convert(records[ch]), places))
+        decimals.append(places)
+    if options["digital"]:
+        if events is not None:
+            # Digital lines were recorded as transitions only; rebuild the words for this chunk
+            word = expand_events(events[0], events[1], first, first + count * step, step)
+        else:
+            word = combine_ports(records["PORT0"], records["PORT1"] if "PORT1" in records.dtype.names else None)
+        word_min = None
+        if options["digital_min"]:
+            word_min = combine_ports(records["PORT0_min"],
+                                     records["PORT1_min"] if "PORT1_min" in records.dtype.names else None)
+        if options["digital_format"] == "word":
+            mask = channel_mask(options["digital"])
+            if word_min is not None:
+                columns.append(to_fixed(word_min & mask, 0))
+                decimals.append(0)
+            columns.append(to_fixed(word & mask, 0))
+            decimals.append(0)
+        else:
+            if word_min is not None:
+                bits = unpack_bits_min_max(word_min, word, options["digital"])
+            else:
+                bits = unpack_bits(word, options["digital"])
+            columns.extend(to_fixed(row_bits, 0) for row_bits in bits)
+            decimals.extend([0] * len(bits))
+    return encode_rows(columns, decimals)
+
+
+def chunk_bounds(num_samples, chunk_samples, decimate):
+    """Split [0, num_samples) into chunks whose starts stay on the decimation grid."""
+    chunk_samples = max(decimate, chunk_samples - chunk_samples % decimate)
+    for start in range(0, num_samples, chunk_samples):
+        yield start, min(start + chunk_samples, num_samples)
+
+
+def convert_capture(filename, output, channels=None, digital=None, time_column=True, time_unit=None, decimate=1,
+                    chunk_samples=DEFAULT_CHUNK_SAMPLES, workers=None, progress=None, digital_format="bits",
+                    precision=None):
+    """Convert a raw capture to CSV. Returns the number of rows written.
+    channels/digital default to everything that was recorded. digital_format is "bits" (a column per digital
+    channel) or "word" (one 16-bit column). precision is the number of decimals of the mV columns (None: enough
+    to resolve one ADC count). progress, if given, is called with
+    (samples_done, total_samples) after each chunk is written.
+    """
+    metadata = read_metadata(filename)
+    data, _ = open_capture(filename)
+    num_samples = len(data)
+    recorded_fields = data.dtype.names
+    # Scanned once here rather than by every chunk
+    frames = getattr(data, "frames", None)
+    del data
+
+    recorded = metadata["channel_order"]
+    if channels is None:
+        channels = recorded
+    missing = [ch for ch in channels if ch not in recorded]
+    if missing:
+        raise ValueError(f"Channels {missing} were not recorded in {filename} (recorded: {recorded})")
+    if digital is None:
+        digital = metadata.get("digital_channels", [])
+    if digital and not (metadata.get("digital_ports") or metadata.get("digital_events_file")):
+        raise ValueError(f"No digital ports were recorded in {filename}")
+    if digital_format not in CSV_DIGITAL_FORMATS:
+        raise ValueError(f"Unknown digital format '{digital_format}', expected one of {CSV_DIGITAL_FORMATS}")
+    if decimate < 1:
+        raise ValueError("decimate must be at least 1")
+    if precision is not None and not 0 <= precision <= MAX_DECIMALS:
+        raise ValueError(f"precision must be between 0 and {MAX_DECIMALS}")
+
+    options = {
+        "channels": list(channels),
+        "digital": list(digital),
+        "time_column": time_column,
+        "time_unit": time_unit or metadata.get("time_unit", "ms"),
+        "decimate": decimate,
+        "digital_format": digital_format,
+        "precision": precision,
+        # Captures recorded with aggregate downsampling hold a min and a max per channel
+        "aggregate": metadata.get("downsample_mode") == "aggregate",
+        # and a min and a max port word, unless the digital lines were only recorded as transitions
+        "digital_min": bool(digital) and "PORT0_min" in recorded_fields,
+    }
+    events = None
+    if digital and metadata.get("digital_events_file"):
+        events = read_events(os.path.join(os.path.dirname(os.path.abspath(filename)), metadata["digital_events_file"]))
+    workers = workers or os.cpu_count() or 1
+    rows = 0
+
+    with open(output, "wb") as out, ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                        initargs=(filename, frames, events)) as executor:
+        text = io.StringIO()
+        csv.writer(text).writerow(csv_header(options))
+        out.write(text.getvalue().encode())
+
+        # Keep a bounded window of chunks in flight and write them strictly in order
+        pending = deque()
+        for start, stop in chunk_bounds(num_samples, chunk_samples, decimate):
+            pending.append((stop, executor.submit(_convert_worker_chunk, options, start, stop)))
+            if len(pending) >= workers * 2:
+                rows += _write_next(out, pending, num_samples, progress)
+        while pending:
+            rows += _write_next(out, pending, num_samples, progress)
+    return rows
+
+
+def _write_next(out, pending, num_samples, progress):
+    stop, future = pending.popleft()
+    piece = future.result()
+    out.write(piece)
+    if progress is not None:
+        progress(stop, num_samples)
+    return piece.count(b"\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a raw PicoScope capture (.bin + .json) to CSV in mV.")
+    parser.add_argument("capture", help="raw capture .bin file (its .json sidecar must sit next to it)")
+    parser.add_argument("-o", "--output", help="output CSV file (default: capture name with .csv)")
+    parser.add_argument("--channels", help="comma separated analog channels to convert, e.g. A,C (default: all)")
+    parser.add_argument("--digital", help="comma separated digital channels to convert, e.g. 0,7,15 "
+                                          "(default: those recorded, use '' for none)")
+    parser.add_argument("--digital-format", choices=CSV_DIGITAL_FORMATS, default="bits",
+                        help="a 0/1 column per digital channel (bits) or one 16-bit column (word)")
+    parser.add_argument("--no-time", action="store_true", help="leave out the time column")
+    parser.add_argument("--time-unit", choices=["s", "ms", "us", "ns"],
+                        help="unit of the time column (default: the unit used when recording)")
+    parser.add_argument("--precision", type=int,
+                        help="decimals of the mV columns (default: enough to resolve one ADC count)")
+    parser.add_argument("--decimate", type=int, default=1, help="keep every Nth sample")
+    parser.add_argument("--chunk-samples", type=int, default=DEFAULT_CHUNK_SAMPLES,
+                        help="samples converted per work item")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.capture)[0] + ".csv"
+    channels = [ch.strip().upper() for ch in args.channels.split(",")] if args.channels else None
+    digital = None
+    if args.digital is not None:
+        digital = [int(d) for d in args.digital.split(",") if d.strip()]
+
+    def report(done, total):
+        print(f"\rConverted {done}/{total} samples ({100.0 * done / max(total, 1):.1f}%)", end="", flush=True)
+
+    started = time.perf_counter()
+    rows = convert_capture(args.capture, output, channels=channels, digital=digital, time_column=not args.no_time,
+                           time_unit=args.time_unit, decimate=args.decimate, chunk_samples=args.chunk_samples,
+                           workers=args.workers, progress=report, digital_format=args.digital_format,
+                           precision=args.precision)
+    print(f"\nWrote {rows} rows to {os.path.abspath(output)} in {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
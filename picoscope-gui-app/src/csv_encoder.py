@@ -0,0 +1,109 @@
+import math
+import numpy as np
+
+from scaling import TIME_UNIT_DIVISORS
+
+# Most decimals written for a value
+MAX_DECIMALS = 9
+
+# Same row terminator as the csv module writes
+LINE_TERMINATOR = b"\r\n"
+
+_ZERO = ord("0")
+_MINUS = ord("-")
+_POINT = ord(".")
+_COMMA = ord(",")
+
+
+def scale_decimals(scale):
+    """Decimals that resolve one ADC count of a scaling.ChannelScale (one more than the step needs)."""
+    return max(0, min(MAX_DECIMALS, math.ceil(-math.log10(scale.factor)) + 1))
+
+
+def time_decimals(sample_interval_ns, time_unit):
+    """Decimals that show every sample interval in the given time unit exactly (never below 1 ns)."""
+    divisor = TIME_UNIT_DIVISORS.get(time_unit, 1e6)
+    if divisor is None:
+        return 0
+    decimals = 0
+    step = int(sample_interval_ns)
+    while decimals < MAX_DECIMALS and 10 ** decimals < divisor and step * 10 ** decimals % int(divisor):
+        decimals += 1
+    return decimals
+
+
+def to_fixed(values, decimals):
+    """Round values to `decimals` places as int64 fixed-point numbers (value * 10**decimals)."""
+    if decimals == 0 and values.dtype.kind in "iub":
+        return values.astype(np.int64)
+    return np.rint(np.multiply(values, 10.0 ** decimals)).astype(np.int64)
+
+
+def sample_times_fixed(first_sample, num_samples, sample_interval_ns, time_unit, decimals, step=1):
+    """Fixed-point times of samples first_sample, first_sample + step, ... Integer arithmetic throughout, so the
+    times are exact however long the recording runs.
+    """
+    indexes = np.arange(first_sample, first_sample + num_samples * step, step, dtype=np.int64)
+    elapsed_ns = indexes * int(sample_interval_ns)
+    divisor = TIME_UNIT_DIVISORS.get(time_unit, 1e6)
+    if divisor is None:
+        return elapsed_ns
+    quantum = int(divisor) // 10 ** decimals  # ns per last written digit
+    return (elapsed_ns + quantum // 2) // quantum
+
+
+def format_fixed(fixed, decimals):
+    """ASCII text of int64 fixed-point numbers with `decimals` decimals, right-aligned in a character matrix.
+    Returns (chars, valid): two (n, width) arrays; the text of row i is chars[i][valid[i]].
+    """
+    fixed = np.asarray(fixed, dtype=np.int64)
+    count = len(fixed)
+    negative = fixed < 0
+    magnitude = np.abs(fixed)
+    largest = int(magnitude.max()) if count else 0
+    digits = max(len(str(largest)), decimals + 1)  # at least one digit before the point
+    point = 1 if decimals else 0
+    width = 1 + digits + point  # sign, digits, decimal point
+
+    chars = np.empty((count, width), dtype=np.uint8)
+    # Peel off the digits from the right, skipping over the decimal point
+    column = width - 1
+    remaining = magnitude.copy()
+    for place in range(digits):
+        if decimals and place == decimals:
+            chars[:, column] = _POINT
+            column -= 1
+        chars[:, column] = remaining % 10 + _ZERO
+        remaining //= 10
+        column -= 1
+
+    # Characters in use per row: the decimals and point, plus one integer digit and one more per power of ten
+    used = np.full(count, 1 + decimals + point, dtype=np.int64)
+    for power in range(decimals + 1, digits):
+        used += magnitude >= 10 ** power
+    first = width - used  # first column in use; column 0 is always free for the sign
+    signed = np.flatnonzero(negative)
+    first[signed] -= 1
+    chars[signed, first[signed]] = _MINUS
+    valid = np.arange(width) >= first[:, None]
+    return chars, valid
+
+
+def encode_rows(columns, decimals, line_terminator=LINE_TERMINATOR):
+    """Encode a block of CSV rows at once. columns are int64 fixed-point arrays of equal length (see to_fixed),
+    decimals the number of decimals of each. Returns the rows as ASCII bytes.
+    """
+    if not columns:
+        return b""
+    count = len(columns[0])
+    parts = []
+    masks = []
+    for index, (column, places) in enumerate(zip(columns, decimals)):
+        chars, valid = format_fixed(column, places)
+        parts.append(chars)
+        masks.append(valid)
+        separator = line_terminator if index == len(columns) - 1 else b","
+        parts.append(np.broadcast_to(np.frombuffer(separator, dtype=np.uint8), (count, len(separator))))
+        masks.append(np.ones((count, len(separator)), dtype=bool))
+    # Keep only the characters in use, row by row: one boolean gather for the whole block
+    return np.hstack(parts)[np.hstack(masks)].tobytes()
@@ -1,15 +1,46 @@
 import ctypes
+import logging
 import numpy as np
 from picosdk.functions import adc2mV, assert_pico_ok
 import time
-import csv
 import os
-from PyQt5 import QtCore
-import traceback
+import threading
+from ring_buffer import BlockRing, POLICY_BLOCK
+from stream_writer import BlockCsvSink, CsvSink, StreamWriter
+from raw_capture import PreallocatedRawSink, RawSink
+from compression import CompressedRawSink
+from scaling import VOLTAGE_RANGES, ChannelScale, sample_times
+from telemetry import AcquisitionStats, format_snapshot
+from polling import AdaptivePoller
+from buffer_sizing import AUTO_SIZE_TOLERANCE, TARGET_CALLBACK_HZ, auto_size, size_error
+from digital import DIGITAL_FORMATS, channel_mask, combine_ports, unpack_bits, unpack_bits_min_max
+from digital_events import DigitalEventSink, events_path
+from segments import SegmentedSink, manifest_path
+from block_times import BlockTimeLog, blocks_path
+from csv_encoder import MAX_DECIMALS, encode_rows, sample_times_fixed, scale_decimals, time_decimals, to_fixed
+
+log = logging.getLogger(__name__)
 
 # Add the global signal for first sample recording
 first_sample_recorded = None  # Global signal that GUI can connect to
 
+# Seconds between telemetry summaries in the console log
+STATS_LOG_INTERVAL = 5.0
+
+# Output formats accepted by DataAcquisition.start_recording
+OUTPUT_FORMATS = ("csv", "raw")
+
+# Ring depth used with a fixed sizeOfOneBuffer when ring_blocks is not given
+DEFAULT_RING_BLOCKS = 32
+
+# Driver buffers captured when neither numBuffersToCapture nor total_samples is given: in practice, until stopped
+UNBOUNDED_BUFFERS = 999999999
+
+# Driver downsampling modes accepted by DataAcquisition.start_recording. The ratio mode values are the same
+# on the PS3000A and PS4000A and are only used when the driver does not expose its own table.
+DOWNSAMPLE_MODES = ("none", "aggregate", "average", "decimate")
+RATIO_MODE_VALUES = {"none": 0, "aggregate": 1, "decimate": 2, "average": 4}
+
 class DataAcquisition:
     def __init__(self, driver):
         self.driver = driver
@@ -24,9 +55,21 @@ class DataAcquisition:
         self.nextSample = 0
         self.autoStopOuter = False
         self.wasCalledBack = False
-        self.csvfile = None
-        self.csvwriter = None
-        self.csv_initialized = False
+        self.sink = None  # Output sink, written only from the writer thread
+        self.ring = None  # Blocks handed from the driver callback to the writer thread
+        self.writer = None
+        self.analog_channels = []  # Enabled analog channels in column order
+        self.channel_ranges = {}  # Range constant actually passed to psSetChannel
+        self.channel_offsets = {}  # Analogue offset (V) actually passed to psSetChannel
+        self.channel_scales = {}  # ChannelScale (counts to mV) per enabled channel, built once per recording
+        self.stats = AcquisitionStats()  # Live telemetry, safe to snapshot from any thread
+        self.sizeOfOneBuffer = 10000  # Driver buffer size of the current recording
+        self.auto_sized = False  # sizeOfOneBuffer was chosen by buffer_sizing.auto_size
+        self.downsample_mode = "none"  # One of DOWNSAMPLE_MODES
+        self.downsample_ratio = 1  # Hardware samples per delivered sample
+        self.outputIntervalNs = 250 * 1000  # Time between delivered (downsampled) samples
+        self.poller = None  # AdaptivePoller for the current recording
+        self._stop_event = threading.Event()  # Wakes the polling loop as soon as a stop is requested
         self.maxADC = ctypes.c_int16(0)
         self.sample_interval = 0.25  # Default in ms
         self.sampleIntervalNs = 250 * 1000  # Default, will be updated
@@ -34,6 +77,17 @@ class DataAcquisition:
         self.bufferDigital0 = None  # For D0-D7
         self.bufferDigital1 = None  # For D8-D15
         self.digital_channels = []
+        self.digital_format = "bits"  # One of digital.DIGITAL_FORMATS, for CSV output
+        self.compression = None  # Codec name for compressed raw output
+        self.compression_filter = "bitshuffle"  # block_filter applied before compressing
+        self.preallocate = False  # Write raw output through a preallocated memory map
+        self.direct_sink = None  # Sink the callback writes to itself (preallocated output)
+        self.block_times = None  # BlockTimeLog of the current recording, if enabled
+        self.time_column_enabled = True  # Write the per-sample time column in CSV output
+        self.startTimeNs = 0  # Wall clock when streaming started (time.time_ns)
+        self.startPerf = 0.0  # time.perf_counter() at the same moment
+        self.csv_precision = None  # Decimals of the mV CSV columns, None for automatic
+        self.fast_csv = True  # Encode CSV blocks with csv_encoder rather than the csv module
         # Fix voltage range storage - use actual constants instead of strings
         self.voltage_range = {
             "A": None,  # Will be set to actual range constant
@@ -65,10 +119,81 @@ class DataAcquisition:
         """Set the maximum voltage rail for a channel."""
         self.voltage_max[channel] = vmax
 
-    def start_recording(self, sizeOfOneBuffer=10000, numBuffersToCapture=999999999, filename="acquisition.csv",
+    def start_recording(self, sizeOfOneBuffer=10000, numBuffersToCapture=None, filename="acquisition.csv",
                         time_unit="ms", sample_interval=0.25, channels={"A": True, "B": False, "C": False, "D": False},
-                        digital_channels=None):
-        print("Started Recording")
+                        digital_channels=None, ring_blocks=None, full_policy=POLICY_BLOCK, output_format="csv",
+                        downsample_mode="none", downsample_ratio=1, digital_format="bits",
+                        segment_samples=None, segment_bytes=None, segment_minutes=None, compression=None,
+                        compression_filter="bitshuffle", preallocate=False, block_times=False, time_column=True,
+                        csv_precision=None, fast_csv=True, total_samples=None):
+        """Open the device and stream to `filename` until stopped.
+        sizeOfOneBuffer: driver buffer size in samples, or "auto" to derive it (and ring_blocks, unless given)
+            from the sample interval and the enabled channels, see buffer_sizing.auto_size.
+        numBuffersToCapture: stop after this many driver buffers (None streams until stopped).
+        total_samples: stop after exactly this many recorded samples; takes precedence over numBuffersToCapture.
+        ring_blocks: number of driver-sized blocks buffered between the callback and the writer thread
+            (DEFAULT_RING_BLOCKS for a fixed sizeOfOneBuffer).
+        full_policy: what to do when the writer falls behind and the ring is full, see ring_buffer.FULL_POLICIES.
+        output_format: "csv" for converted mV values, or "raw" for int16 ADC counts in a .bin file with a
+            .json sidecar (read it back with raw_capture.open_capture).
+        downsample_mode/downsample_ratio: let the driver reduce every `downsample_ratio` samples to one before
+            they cross USB. "aggregate" delivers a min and a max per channel and digital port (so short glitches still show up),
+            "average" the mean and "decimate" one sample out of each group. sample_interval stays the hardware
+            interval; the recorded samples are downsample_ratio times further apart.
+        digital_format: "bits" writes a 0/1 CSV column per digital channel, "word" a single column with the
+            16-bit D15-D0 word (unselected lines masked to 0); raw output stores the port words for both.
+            "events" keeps the digital lines out of the main file and writes only their transitions to
+            <name>.events.csv (read back with digital_events.read_events/expand_events).
+        segment_samples/segment_bytes/segment_minutes: split the output into numbered files (name_0001.csv, ...)
+            of at most this many samples, bytes or minutes each, listed in name.manifest.json.
+        compression: for raw output, compress every block into its own frame with "zstd", "lz4" or "zlib"
+            ("auto" picks the first one installed). raw_capture.open_capture reads the result back.
+        compression_filter: delta-encode and "bitshuffle" or "byteshuffle" every block before compressing it
+            (see block_filter), or None to compress the records as they are.
+        preallocate: for raw output of a known length, allocate the whole .bin file up front and let the driver
+            callback copy every block straight into its place in a memory map, bypassing the ring and the writer
+            thread (see raw_capture.PreallocatedRawSink). The length must be given explicitly, as total_samples or
+            as numBuffersToCapture with a fixed sizeOfOneBuffer.
+        block_times: write <name>.blocks.csv with the first sample, length and host time of every driver block
+            (see block_times). Sample times can then be derived on read from the start time in the metadata.
+        time_column: False leaves the per-sample time column out of CSV output. CSV output always gets a <name>.json
+            sidecar with the start time and sample interval, so block_times.sample_clock_times still works.
+        csv_precision: decimals written for the mV columns of CSV output. None picks enough to resolve one ADC
+            count of each channel's range. Times always get as many decimals as the sample interval needs.
+        fast_csv: format CSV a whole block at a time with csv_encoder (the default). False goes back to the
+            csv module, which writes full float precision but is several times slower.
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}', expected one of {OUTPUT_FORMATS}")
+        if downsample_mode not in DOWNSAMPLE_MODES:
+            raise ValueError(f"Unknown downsample mode '{downsample_mode}', expected one of {DOWNSAMPLE_MODES}")
+        if compression and output_format != "raw":
+            raise ValueError("Compression is only available for raw output")
+        self.compression = compression
+        self.compression_filter = compression_filter
+        if digital_format not in DIGITAL_FORMATS:
+            raise ValueError(f"Unknown digital format '{digital_format}', expected one of {DIGITAL_FORMATS}")
+        if preallocate and (output_format != "raw" or compression or digital_format == "events"
+                            or segment_samples or segment_bytes or segment_minutes):
+            raise ValueError("preallocate needs uncompressed, unsegmented raw output without digital events")
+        if preallocate and total_samples is None and (numBuffersToCapture is None or sizeOfOneBuffer == "auto"):
+            raise ValueError("preallocate needs the capture length: pass total_samples, or numBuffersToCapture "
+                             "with a fixed sizeOfOneBuffer")
+        if total_samples is not None and total_samples < 1:
+            raise ValueError("total_samples must be at least 1")
+        self.preallocate = preallocate
+        self.time_column_enabled = time_column
+        if csv_precision is not None and not 0 <= csv_precision <= MAX_DECIMALS:
+            raise ValueError(f"csv_precision must be between 0 and {MAX_DECIMALS}")
+        self.csv_precision = csv_precision
+        self.fast_csv = fast_csv
+        self.digital_format = digital_format
+        downsample_ratio = int(downsample_ratio)
+        if downsample_ratio < 1:
+            raise ValueError("downsample_ratio must be at least 1")
+        self.downsample_mode = downsample_mode
+        self.downsample_ratio = downsample_ratio if downsample_mode != "none" else 1
+        log.info("Started Recording")
         self.is_recording = True  # Set recording state
         self.time_unit = time_unit  # Store the selected unit
         self.sample_interval = sample_interval
@@ -79,10 +204,27 @@ class DataAcquisition:
             self.digital_channels = digital_channels
         else:
             if digital_channels:
-                print("Warning: Digital channels requested but not supported by this scope model.")
+                log.warning("Digital channels requested but not supported by this scope model.")
             self.digital_channels = []
-        
-        self.totalSamples = sizeOfOneBuffer * numBuffersToCapture
+        self.analog_channels = [ch for ch in "ABCD" if channels.get(ch, False)]
+
+        self.auto_sized = sizeOfOneBuffer == "auto"
+        if self.auto_sized:
+            _, _, requestedIntervalNs = self._streaming_interval()
+            # Size for the delivered rate
+            sizeOfOneBuffer, auto_blocks = auto_size(requestedIntervalNs * self.downsample_ratio,
+                                                     *self._auto_size_sources())
+            if ring_blocks is None:
+                ring_blocks = auto_blocks
+            log.info(f"Auto buffer sizing: {sizeOfOneBuffer} samples per driver buffer, {ring_blocks} ring blocks")
+        elif ring_blocks is None:
+            ring_blocks = DEFAULT_RING_BLOCKS
+        self.sizeOfOneBuffer = sizeOfOneBuffer
+
+        if total_samples is not None:
+            self.totalSamples = int(total_samples)
+        else:
+            self.totalSamples = sizeOfOneBuffer * (numBuffersToCapture or UNBOUNDED_BUFFERS)
         # For streaming mode, don't allocate large complete buffers - stream directly to CSV
         # Only small driver buffers are needed (allocated in setup_buffers)
         self.bufferCompleteA = None
@@ -94,24 +236,7 @@ class DataAcquisition:
         self.nextSample = 0
         self.autoStopOuter = False
         self.wasCalledBack = False
-        self.csv_initialized = False
-
-        # Open CSV file for writing
-        header = [f'Time ({time_unit})']
-        if channels.get("A", False):
-            header.append('Channel A (mV)')
-        if channels.get("B", False):
-            header.append('Channel B (mV)')
-        if channels.get("C", False):
-            header.append('Channel C (mV)')
-        if channels.get("D", False):
-            header.append('Channel D (mV)')
-        for dch in self.digital_channels:
-            header.append(f'D{dch}')
-        self.csvfile = open(filename, mode='w', newline='')
-        print(f"Logging data to: {os.path.abspath(filename)}")
-        self.csvwriter = csv.writer(self.csvfile)
-        self.csvwriter.writerow(header)
+        self._stop_event.clear()
 
         self.status["openunit"] = self.driver.psOpenUnit(ctypes.byref(self.chandle), None)
         try:
@@ -129,13 +254,145 @@ class DataAcquisition:
         self.setup_channels()
         self.setup_buffers(sizeOfOneBuffer)
 
+        # Open the output once the enabled channels are final
+        self.sink = self._open_sink(filename, output_format, sizeOfOneBuffer,
+                                    segment_samples, segment_bytes, segment_minutes)
+        self.block_times = BlockTimeLog(blocks_path(filename)) if block_times else None
+        if self.block_times:
+            log.info(f"Logging block times to: {os.path.abspath(self.block_times.filename)}")
+        # A preallocated file is written by the callback itself and closed by stop_recording: no ring, no writer
+        self.direct_sink = self.sink if self.preallocate else None
+        self.ring = None
+        self.writer = None
+
+        if self.direct_sink is None:
+            # Start the writer thread before any data can arrive
+            self.ring = BlockRing(ring_blocks, sizeOfOneBuffer, len(self.analog_channels),
+                                  2 if self.digital_channels else 0, policy=full_policy,
+                                  num_analog_min=len(self.analog_channels) if self._aggregating() else 0,
+                                  num_digital_min=2 if self.digital_channels and self._aggregating() else 0)
+            self.writer = StreamWriter(self.ring, self.sink, stats=self.stats)
+            self.writer.start()
+
         # Get maxADC value before streaming and check for errors
         self.status["maximumValue"] = self.driver.psMaximumValue(self.chandle, ctypes.byref(self.maxADC))
         assert_pico_ok(self.status["maximumValue"])
+        self.build_channel_scales()
 
         # Begin streaming mode
         self.run_streaming(sizeOfOneBuffer)
 
+    def _auto_size_sources(self):
+        """(analog, digital port) buffers the driver fills; aggregate mode fills a min and a max buffer for each."""
+        per_source = 2 if self._aggregating() else 1
+        return len(self.analog_channels) * per_source, (2 if self.digital_channels else 0) * per_source
+
+    def _check_auto_size(self, sizeOfOneBuffer):
+        """Warn when the interval the driver settled on makes the automatic buffer size a poor fit. The buffers are
+        registered and streaming has started by then, so the size itself stays as it is.
+        """
+        factor, ideal = size_error(sizeOfOneBuffer, self.outputIntervalNs, *self._auto_size_sources())
+        if factor > AUTO_SIZE_TOLERANCE:
+            log.warning(f"The automatic driver buffer of {sizeOfOneBuffer} samples was sized for the requested "
+                        f"interval; at {self.outputIntervalNs} ns per sample about {ideal} samples would give "
+                        f"{TARGET_CALLBACK_HZ:g} callbacks/s. Pass a fixed sizeOfOneBuffer to choose it yourself")
+
+    def _digital_events(self):
+        return bool(self.digital_channels) and self.digital_format == "events"
+
+    def _open_sink(self, filename, output_format, sizeOfOneBuffer, segment_samples=None, segment_bytes=None,
+                   segment_minutes=None):
+        if output_format == "raw" and not filename.lower().endswith(".bin"):
+            filename = os.path.splitext(filename)[0] + ".bin"
+        if not (segment_samples or segment_bytes or segment_minutes):
+            return self._create_sink(filename, output_format, sizeOfOneBuffer)
+        # New segments are opened by the writer thread as the limits are reached
+        sink = SegmentedSink(lambda segment_filename: self._create_sink(segment_filename, output_format, sizeOfOneBuffer),
+                             filename, max_samples=segment_samples, max_bytes=segment_bytes,
+                             max_seconds=segment_minutes * 60 if segment_minutes else None)
+        log.info(f"Segment list: {os.path.abspath(manifest_path(filename))}")
+        return sink
+
+    def _create_sink(self, filename, output_format, sizeOfOneBuffer):
+        digital_ports = 2 if self.digital_channels and not self._digital_events() else 0
+        if output_format == "raw" and self.preallocate:
+            sink = PreallocatedRawSink(filename, self.analog_channels, digital_ports, self.totalSamples,
+                                       with_min=self._aggregating())
+        elif output_format == "raw" and self.compression:
+            sink = CompressedRawSink(filename, self.analog_channels, digital_ports, sizeOfOneBuffer,
+                                     with_min=self._aggregating(), codec=self.compression, stats=self.stats,
+                                     block_filter=self.compression_filter)
+        elif output_format == "raw":
+            sink = RawSink(filename, self.analog_channels, digital_ports, sizeOfOneBuffer,
+                           with_min=self._aggregating())
+        else:
+            header = [f'Time ({self.time_unit})'] if self.time_column_enabled else []
+            for ch in self.analog_channels:
+                if self._aggregating():
+                    header.append(f'Channel {ch} min (mV)')
+                    header.append(f'Channel {ch} max (mV)')
+                else:
+                    header.append(f'Channel {ch} (mV)')
+            if self.digital_channels and self.digital_format == "word":
+                if self._aggregating():
+                    header.append('Digital min (D15-D0)')
+                    header.append('Digital max (D15-D0)')
+                else:
+                    header.append('Digital (D15-D0)')
+            elif digital_ports:
+                for dch in self.digital_channels:
+                    if self._aggregating():
+                        header.append(f'D{dch} min')
+                        header.append(f'D{dch} max')
+                    else:
+                        header.append(f'D{dch}')
+            if self.fast_csv:
+                sink = BlockCsvSink(filename, header, self.encode_block)
+            else:
+                sink = CsvSink(filename, header, self.convert_block)
+        log.info(f"Logging data to: {os.path.abspath(filename)}")
+        if self._digital_events():
+            sink = DigitalEventSink(sink, events_path(filename), self.digital_channels, self.time_unit)
+            log.info(f"Logging digital transitions to: {os.path.abspath(events_path(filename))}")
+        return sink
+
+    def capture_metadata(self):
+        """Describe the running capture so raw ADC counts can be converted later."""
+        return {
+            "sample_interval_ns": self.outputIntervalNs,  # between recorded samples
+            "hardware_sample_interval_ns": self.sampleIntervalNs,
+            "downsample_mode": self.downsample_mode,
+            "downsample_ratio": self.downsample_ratio,
+            "buffer_size": self.sizeOfOneBuffer,
+            "time_unit": self.time_unit,
+            "max_adc": self.maxADC.value,
+            "channel_order": list(self.analog_channels),
+            "channels": {
+                ch: {
+                    "range": self.channel_ranges[ch],
+                    "range_v": VOLTAGE_RANGES.get(self.channel_ranges[ch]),
+                    "analogue_offset_v": self.channel_offsets[ch],
+                    "mv_scale": self.channel_scales[ch].to_dict() if ch in self.channel_scales else None,
+                } for ch in self.analog_channels
+            },
+            "digital_channels": list(self.digital_channels),
+            "digital_ports": ["PORT0", "PORT1"] if self.digital_channels and not self._digital_events() else [],
+            "digital_format": self.digital_format,
+            "start_time": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.startTimeNs / 1e9)),
+            "start_time_ns": self.startTimeNs,  # wall clock (ns since the epoch) when streaming was started
+            "start_monotonic_s": self.startPerf,  # host time.perf_counter() at the same moment
+            "blocks_file": os.path.basename(self.block_times.filename) if self.block_times else None,
+        }
+
+    def build_channel_scales(self):
+        """Precompute the counts to mV conversion for every enabled channel from its actual range and offset."""
+        self.channel_scales = {}
+        if self.maxADC.value == 0:
+            return
+        for ch in self.analog_channels:
+            self.channel_scales[ch] = ChannelScale.for_range(self.channel_ranges[ch], self.maxADC.value,
+                                                             self.channel_offsets[ch])
+
     def setup_channels(self):
         # Use per-channel voltage range and offset
         for ch, pico_ch in zip("ABCD", [
@@ -156,6 +413,8 @@ class DataAcquisition:
             else:
                 channel_range = self.driver.ps_20V
                 analogue_offset = 0.0
+            self.channel_ranges[ch] = channel_range
+            self.channel_offsets[ch] = analogue_offset
             
             self.status[f"setCh{ch}"] = self.driver.psSetChannel(
                 self.chandle,
@@ -269,7 +528,7 @@ class DataAcquisition:
         
         # Handle special cases - some GUI entries might be "MAX" ranges which should be ignored
         if "MAX" in range_string.upper():
-            print(f"Info: Ignoring MAX range '{range_string}', using default 20V")
+            log.info(f"Ignoring MAX range '{range_string}', using default 20V")
             return self.driver.ps_20V
         
         # Try to extract voltage from string (e.g., "5V" from "PICO_DIFFERENTIAL_5V")
@@ -303,11 +562,11 @@ class DataAcquisition:
             }
             
             if voltage_value in voltage_to_range:
-                print(f"Info: Converted '{range_string}' to range constant {voltage_to_range[voltage_value]}")
+                log.info(f"Converted '{range_string}' to range constant {voltage_to_range[voltage_value]}")
                 return voltage_to_range[voltage_value]
         
         # Fallback to 20V if unknown
-        print(f"Warning: Unknown voltage range '{range_string}', defaulting to 20V")
+        log.warning(f"Unknown voltage range '{range_string}', defaulting to 20V")
         return self.driver.ps_20V
 
     def set_voltage_range(self, channel, range_value, offset=0.0):
@@ -324,131 +583,157 @@ class DataAcquisition:
         self.voltage_range[channel] = range_constant
         self.voltage_offset[channel] = offset
 
+    def _aggregating(self):
+        return self.downsample_mode == "aggregate"
+
+    def _ratio_mode_constant(self):
+        """Driver constant for the selected downsampling mode."""
+        suffix = "_RATIO_MODE_" + self.downsample_mode.upper()
+        if hasattr(self.driver.ps_RATIO_MODE, 'get'):
+            for name, value in self.driver.ps_RATIO_MODE.items():
+                if name.endswith(suffix):
+                    return value
+        return RATIO_MODE_VALUES[self.downsample_mode]
+
     def setup_buffers(self, sizeOfOneBuffer):
         memory_segment = 0
-        # Get the correct ratio mode constant for each driver
-        if hasattr(self.driver.ps_RATIO_MODE, 'get'):
-            # PS3000A driver - use dictionary lookup
-            ratio_mode_none = self.driver.ps_RATIO_MODE.get("PS3000A_RATIO_MODE_NONE", 0)
-        else:
-            # PS4000A driver - use direct value or fallback
-            ratio_mode_none = getattr(self.driver, 'ps_RATIO_MODE_NONE', 0)
-
-        # Setup analog channel buffers
-        if self.channels.get("A", False):
-            self.bufferAMax = np.zeros(shape=sizeOfOneBuffer, dtype=np.int16)
-            self.status["setDataBuffersA"] = self.driver.psSetDataBuffers(self.chandle,
-                self.driver.ps_CHANNEL_A,
-                self.bufferAMax.ctypes.data_as(ctypes.POINTER(ctypes.c_int16)),
-                None, sizeOfOneBuffer, memory_segment,
-                ratio_mode_none)
-            assert_pico_ok(self.status["setDataBuffersA"])
-        if self.channels.get("B", False):
-            self.bufferBMax = np.zeros(shape=sizeOfOneBuffer, dtype=np.int16)
-            self.status["setDataBuffersB"] = self.driver.psSetDataBuffers(self.chandle,
-                self.driver.ps_CHANNEL_B,
-                self.bufferBMax.ctypes.data_as(ctypes.POINTER(ctypes.c_int16)),
-                None, sizeOfOneBuffer, memory_segment,
-                ratio_mode_none)
-            assert_pico_ok(self.status["setDataBuffersB"])
-        if self.channels.get("C", False):
-            self.bufferCMax = np.zeros(shape=sizeOfOneBuffer, dtype=np.int16)
-            self.status["setDataBuffersC"] = self.driver.psSetDataBuffers(self.chandle,
-                self.driver.ps_CHANNEL_C,
-                self.bufferCMax.ctypes.data_as(ctypes.POINTER(ctypes.c_int16)),
-                None, sizeOfOneBuffer, memory_segment,
-                ratio_mode_none)
-            assert_pico_ok(self.status["setDataBuffersC"])
-        if self.channels.get("D", False):
-            self.bufferDMax = np.zeros(shape=sizeOfOneBuffer, dtype=np.int16)
-            self.status["setDataBuffersD"] = self.driver.psSetDataBuffers(self.chandle,
-                self.driver.ps_CHANNEL_D,
-                self.bufferDMax.ctypes.data_as(ctypes.POINTER(ctypes.c_int16)),
-                None, sizeOfOneBuffer, memory_segment,
-                ratio_mode_none)
-            assert_pico_ok(self.status["setDataBuffersD"])
+        ratio_mode = self._ratio_mode_constant()
+
+        # Setup analog channel buffers; aggregate mode also needs a min buffer for every source
+        for ch in self.analog_channels:
+            bufferMax = np.zeros(shape=sizeOfOneBuffer, dtype=np.int16)
+            bufferMin = np.zeros(shape=sizeOfOneBuffer, dtype=np.int16) if self._aggregating() else None
+            setattr(self, f"buffer{ch}Max", bufferMax)
+            setattr(self, f"buffer{ch}Min", bufferMin)
+            self.status[f"setDataBuffers{ch}"] = self.driver.psSetDataBuffers(self.chandle,
+                getattr(self.driver, f"ps_CHANNEL_{ch}"),
+                bufferMax.ctypes.data_as(ctypes.POINTER(ctypes.c_int16)),
+                self._optional_pointer(bufferMin, ctypes.c_int16),
+                sizeOfOneBuffer, memory_segment,
+                ratio_mode)
+            assert_pico_ok(self.status[f"setDataBuffers{ch}"])
 
         # Digital buffer setup - only for PS3000A series
         if self.digital_channels and self._has_digital_channels():
             try:
                 self.bufferDigitalMax0 = np.zeros(shape=sizeOfOneBuffer, dtype=np.uint16)
+                self.bufferDigitalMin0 = np.zeros(shape=sizeOfOneBuffer, dtype=np.uint16) if self._aggregating() else None
                 self.status["setDataBuffersDigital0"] = self.driver.psSetDataBuffers(
                     self.chandle,
                     self.driver.ps_DIGITAL_PORT0,  # Remove quotes - use direct constant
                     self.bufferDigitalMax0.ctypes.data_as(ctypes.POINTER(ctypes.c_uint16)),
-                    None, sizeOfOneBuffer, memory_segment,
-                    ratio_mode_none)
+                    self._optional_pointer(self.bufferDigitalMin0, ctypes.c_uint16), sizeOfOneBuffer, memory_segment,
+                    ratio_mode)
                 assert_pico_ok(self.status["setDataBuffersDigital0"])
                 
                 self.bufferDigitalMax1 = np.zeros(shape=sizeOfOneBuffer, dtype=np.uint16)
+                self.bufferDigitalMin1 = np.zeros(shape=sizeOfOneBuffer, dtype=np.uint16) if self._aggregating() else None
                 self.status["setDataBuffersDigital1"] = self.driver.psSetDataBuffers(
                     self.chandle,
                     self.driver.ps_DIGITAL_PORT1,  # Remove quotes - use direct constant
                     self.bufferDigitalMax1.ctypes.data_as(ctypes.POINTER(ctypes.c_uint16)),
-                    None, sizeOfOneBuffer, memory_segment,
-                    ratio_mode_none)
+                    self._optional_pointer(self.bufferDigitalMin1, ctypes.c_uint16), sizeOfOneBuffer, memory_segment,
+                    ratio_mode)
                 assert_pico_ok(self.status["setDataBuffersDigital1"])
             except AttributeError:
                 # Digital ports not available on this driver, disable digital channels
-                print("Warning: Digital channels not available on this scope model. Disabling digital acquisition.")
+                log.warning("Digital channels not available on this scope model. Disabling digital acquisition.")
                 self.digital_channels = []
 
-    def run_streaming(self, sizeOfOneBuffer):
+    def _optional_pointer(self, buffer, ctype):
+        # psSetDataBuffers takes NULL for a min buffer that is not used
+        if buffer is None:
+            return None
+        return buffer.ctypes.data_as(ctypes.POINTER(ctype))
+
+    def _streaming_interval(self):
+        """Translate sample_interval/time_unit into the (sampleInterval, sampleUnits) pair for psRunStreaming.
+        Returns (sampleInterval as c_int32, sampleUnits, interval in ns).
+        """
         # Handle all four time units
         if self.time_unit == "s":
             sampleInterval = ctypes.c_int32(int(self.sample_interval * 1_000_000))  # s to us
             sampleUnits = self.driver.ps_US
-            self.sampleIntervalNs = sampleInterval.value * 1000  # us to ns
+            intervalNs = sampleInterval.value * 1000  # us to ns
         elif self.time_unit == "ms":
             sampleInterval = ctypes.c_int32(int(self.sample_interval * 1000))  # ms to us
             sampleUnits = self.driver.ps_US
-            self.sampleIntervalNs = sampleInterval.value * 1000  # us to ns
+            intervalNs = sampleInterval.value * 1000  # us to ns
         elif self.time_unit == "us":
             sampleInterval = ctypes.c_int32(int(self.sample_interval))  # us
             sampleUnits = self.driver.ps_US
-            self.sampleIntervalNs = sampleInterval.value * 1000  # us to ns
+            intervalNs = sampleInterval.value * 1000  # us to ns
         elif self.time_unit == "ns":
             sampleInterval = ctypes.c_int32(int(self.sample_interval))  # ns
             sampleUnits = self.driver.ps_NS
-            self.sampleIntervalNs = sampleInterval.value  # already ns
+            intervalNs = sampleInterval.value  # already ns
         else:
             sampleInterval = ctypes.c_int32(int(self.sample_interval * 1000))
             sampleUnits = self.driver.ps_US
-            self.sampleIntervalNs = sampleInterval.value * 1000
+            intervalNs = sampleInterval.value * 1000
+        return sampleInterval, sampleUnits, intervalNs
+
+    def run_streaming(self, sizeOfOneBuffer):
+        sampleInterval, sampleUnits, self.sampleIntervalNs = self._streaming_interval()
+        requestedIntervalNs = self.sampleIntervalNs
 
         maxPreTriggerSamples = 0
         autoStopOn = 1
-        downsampleRatio = 1
-
-        # Get the correct ratio mode constant for each driver
-        if hasattr(self.driver.ps_RATIO_MODE, 'get'):
-            # PS3000A driver - use dictionary lookup
-            ratio_mode_none = self.driver.ps_RATIO_MODE.get("PS3000A_RATIO_MODE_NONE", 0)
-        else:
-            # PS4000A driver - use direct value or fallback
-            ratio_mode_none = getattr(self.driver, 'ps_RATIO_MODE_NONE', 0)
+        downsampleRatio = self.downsample_ratio
 
+        # Sample 0 is taken when streaming starts; block host times are relative to this
+        self.startTimeNs = time.time_ns()
+        self.startPerf = time.perf_counter()
+        # totalSamples counts delivered samples, the driver counts hardware samples
         self.status["runStreaming"] = self.driver.psRunStreaming(
             self.chandle,
             ctypes.byref(sampleInterval),
             sampleUnits,
             maxPreTriggerSamples,
-            self.totalSamples,
+            self.totalSamples * downsampleRatio,
             autoStopOn,
             downsampleRatio,
-            ratio_mode_none,
+            self._ratio_mode_constant(),
             sizeOfOneBuffer)
         assert_pico_ok(self.status["runStreaming"])
 
+        # The driver writes back the interval it can actually achieve; time stamps must use that one
+        self.sampleIntervalNs = sampleInterval.value * (1 if sampleUnits == self.driver.ps_NS else 1000)
+        if self.sampleIntervalNs != requestedIntervalNs:
+            log.warning(f"Requested sample interval {requestedIntervalNs} ns, "
+                        f"the scope is sampling every {self.sampleIntervalNs} ns")
+        self.outputIntervalNs = self.sampleIntervalNs * self.downsample_ratio
+        if self.auto_sized and self.sampleIntervalNs != requestedIntervalNs:
+            self._check_auto_size(sizeOfOneBuffer)
+        self.stats.reset(self.analog_channels, self.outputIntervalNs, self.ring)
+        self._warned_drop = False
+        self._warned_overflow = set()
+
+        # Record the final acquisition settings alongside the data
+        self.sink.set_metadata(self.capture_metadata())
+
         # Convert the Python callback to a C function pointer
         self.cFuncPtr = self.driver.StreamingReadyType(self.streaming_callback)
 
+        # Poll period follows the sample rate the driver actually uses (not the requested one) and how much each
+        # poll returns
+        self.poller = AdaptivePoller(self.outputIntervalNs, sizeOfOneBuffer)
+        next_log = time.perf_counter() + STATS_LOG_INTERVAL
         while self.nextSample < self.totalSamples and not self.autoStopOuter:
+            if self.writer is not None and self.writer.error is not None:
+                log.error("Output writer failed, stopping acquisition")
+                break
             self.wasCalledBack = False
+            samplesBefore = self.nextSample
             self.status["getStreamingLastestValues"] = self.driver.psGetStreamingLatestValues(
                 self.chandle, self.cFuncPtr, None)
-            if not self.wasCalledBack:
-                time.sleep(0.01)
+            self.poller.wait(self.nextSample - samplesBefore, self._stop_event)
+            self.stats.set_extra("polling", self.poller.metrics())
+            if self.block_times:
+                self.block_times.flush()
+            if time.perf_counter() >= next_log:
+                log.info(f"Acquisition: {format_snapshot(self.stats.snapshot())}")
+                next_log += STATS_LOG_INTERVAL
 
     # Add a signal for when first sample is recorded
     first_sample_recorded = None  # Global signal that GUI can connect to
@@ -456,126 +741,155 @@ class DataAcquisition:
     def streaming_callback(self, handle, noOfSamples, startIndex, overflow, triggerAt, triggered, autoStop, param):
         global first_sample_recorded
         
+        callbackStart = time.perf_counter()
         self.wasCalledBack = True
         destEnd = self.nextSample + noOfSamples
-        sourceEnd = startIndex + noOfSamples
 
         # Signal when the very first sample is recorded
         if self.nextSample == 0 and first_sample_recorded is not None:
             first_sample_recorded.emit()
 
-        # Debug: Print callback information every 1000 samples
-        if self.nextSample % 1000 == 0:
-            print(f"Callback: samples {self.nextSample}-{destEnd}, received {noOfSamples} samples")
+        # Warn once per channel when the driver reports an over-range input; telemetry keeps the counts
+        if overflow:
+            for bit, ch in enumerate("ABCD"):
+                if overflow & (1 << bit) and ch in self.analog_channels and ch not in self._warned_overflow:
+                    self._warned_overflow.add(ch)
+                    log.warning(f"Channel {ch} input over range (first seen at sample {self.nextSample})")
 
-        if self.maxADC.value != 0:
-            # Use the default 20V range for ADC conversion (this could be improved to use per-channel ranges)
-            channel_range = self.driver.ps_20V
-            
-            # Stream directly from driver buffers - no large buffer copying needed
-            sampleIntervalNs = self.sampleIntervalNs
+        if self.block_times:
+            self.block_times.record(self.nextSample, noOfSamples, callbackStart - self.startPerf)
 
-            for i in range(noOfSamples):
-                sample_index = startIndex + i
-                
-                if self.time_unit == "s":
-                    t = (self.nextSample + i) * sampleIntervalNs / 1e9  # seconds
-                elif self.time_unit == "ms":
-                    t = (self.nextSample + i) * sampleIntervalNs / 1e6  # milliseconds
-                elif self.time_unit == "us":
-                    t = (self.nextSample + i) * sampleIntervalNs / 1e3  # microseconds
-                elif self.time_unit == "ns":
-                    t = (self.nextSample + i) * sampleIntervalNs  # nanoseconds
-                else:
-                    t = (self.nextSample + i) * sampleIntervalNs / 1e6  # default to milliseconds
-
-                row = [t]
-                # Read analog channel data directly from driver buffers
-                if self.channels.get("A", False):
-                    adc_val = self.bufferAMax[sample_index]
-                    mv_val = self.adc_to_mv_single(adc_val, channel_range, self.maxADC)
-                    row.append(mv_val)
-                if self.channels.get("B", False):
-                    adc_val = self.bufferBMax[sample_index]
-                    mv_val = self.adc_to_mv_single(adc_val, channel_range, self.maxADC)
-                    row.append(mv_val)
-                if self.channels.get("C", False):
-                    adc_val = self.bufferCMax[sample_index]
-                    mv_val = self.adc_to_mv_single(adc_val, channel_range, self.maxADC)
-                    row.append(mv_val)
-                if self.channels.get("D", False):
-                    adc_val = self.bufferDMax[sample_index]
-                    mv_val = self.adc_to_mv_single(adc_val, channel_range, self.maxADC)
-                    row.append(mv_val)
-                # Read digital channel data directly from driver buffers
-                if self.digital_channels:
-                    digital_sample0 = self.bufferDigitalMax0[sample_index]
-                    digital_sample1 = self.bufferDigitalMax1[sample_index]
-                    for dch in self.digital_channels:
-                        if dch < 8:
-                            row.append((digital_sample0 >> dch) & 1)
-                        else:
-                            row.append((digital_sample1 >> (dch - 8)) & 1)
-                
-                # Write this sample's row immediately to CSV
-                self.csvwriter.writerow(row)
-                
-                # Flush CSV file periodically
-                if (self.nextSample + i) % 1000 == 0:
-                    self.csvfile.flush()
+        if self.maxADC.value != 0:
+            # Only copy the raw slice here; conversion and disk I/O happen on the writer thread
+            analog_sources = [getattr(self, f"buffer{ch}Max") for ch in self.analog_channels]
+            digital_sources = [self.bufferDigitalMax0, self.bufferDigitalMax1] if self.digital_channels else []
+            analog_min_sources = [getattr(self, f"buffer{ch}Min") for ch in self.analog_channels] if self._aggregating() else ()
+            digital_min_sources = [self.bufferDigitalMin0, self.bufferDigitalMin1] if self.digital_channels and self._aggregating() else ()
+            if self.direct_sink is not None:
+                stored = self.direct_sink.store(self.nextSample, analog_sources, digital_sources, startIndex,
+                                                noOfSamples, analog_min_sources, digital_min_sources)
+                self.stats.record_write(stored, stored * self.direct_sink.dtype.itemsize)
+            elif not self.ring.push(self.nextSample, analog_sources, digital_sources, startIndex, noOfSamples,
+                                  analog_min_sources, digital_min_sources):
+                if not self._warned_drop:
+                    self._warned_drop = True
+                    log.warning(f"Output writer is behind, dropping data from sample {self.nextSample}-{destEnd}")
 
         self.nextSample += noOfSamples
         if autoStop:
             self.autoStopOuter = True
-            print("Auto-stop triggered by driver")
+            log.info("Auto-stop triggered by driver")
+        self.stats.record_callback(noOfSamples, time.perf_counter() - callbackStart, overflow)
 
     def stop_recording(self):
         if not self.is_recording:
-            print("No recording in progress")
+            log.warning("No recording in progress")
             return
             
-        print("Stopping Recording")
+        log.info("Stopping Recording")
+        self.autoStopOuter = True  # Let the polling loop exit
+        self._stop_event.set()  # and wake it if it is waiting for the next poll
         try:
             self.status["stop"] = self.driver.psStop(self.chandle)
             assert_pico_ok(self.status["stop"])
             self.status["close"] = self.driver.psCloseUnit(self.chandle)
             assert_pico_ok(self.status["close"])
         except Exception as e:
-            print(f"Error stopping recording: {e}")
+            log.error(f"Error stopping recording: {e}")
         finally:
             self.is_recording = False  # Clear recording state
-            # Close CSV file if open
-            if self.csvfile:
-                self.csvfile.close()
-                self.csvfile = None
-                self.csvwriter = None
+            # Let the writer flush the queued blocks; it closes the output file when done
+            if self.writer:
+                self.writer.finish()
+                if self.ring.dropped_blocks:
+                    log.warning(f"{self.ring.dropped_samples} samples in {self.ring.dropped_blocks} blocks "
+                                f"were dropped because the writer fell behind")
+                self.writer = None
+            elif self.sink:
+                self.sink.close()
+            self.sink = None
+            self.direct_sink = None
+            if self.block_times:
+                self.block_times.close()
+                self.block_times = None
 
     def adc_to_mv_single(self, adc_value, voltage_range_constant, maxADC):
         """Convert a single ADC count to millivolts."""
-        # Voltage range mapping for both PS3000A and PS4000A
-        voltage_ranges = {
-            0: 0.01,    # 10mV
-            1: 0.02,    # 20mV
-            2: 0.05,    # 50mV
-            3: 0.1,     # 100mV
-            4: 0.2,     # 200mV
-            5: 0.5,     # 500mV
-            6: 1.0,     # 1V
-            7: 2.0,     # 2V
-            8: 5.0,     # 5V
-            9: 10.0,    # 10V
-            10: 20.0,   # 20V
-            11: 50.0,   # 50V
-            12: 100.0,  # 100V
-            13: 200.0,  # 200V
-        }
-        
         # Get the voltage range in volts, default to 20V if unknown
-        vRange = voltage_ranges.get(voltage_range_constant, 20.0)
+        vRange = VOLTAGE_RANGES.get(voltage_range_constant, 20.0)
         
         # Convert to millivolts: (ADC_value * voltage_range_in_volts * 1000) / max_ADC
         return (int(adc_value) * vRange * 1000.0) / maxADC.value
 
+    def time_column(self, firstSample, noOfSamples):
+        """Build the time column for a block of samples in the selected time unit."""
+        return sample_times(firstSample, noOfSamples, self.outputIntervalNs, self.time_unit)
+
+    def convert_block(self, block):
+        """Convert a RingBlock of raw driver samples into CSV columns.
+        Returns a list of 1-D arrays in header order: time, analog channels (mV, min then max when aggregating),
+        then digital channels (also min then max when aggregating).
+        """
+        count = block.count
+
+        columns = [self.time_column(block.first_sample, count)] if self.time_column_enabled else []
+        for row, ch in enumerate(self.analog_channels):
+            if self._aggregating():
+                columns.append(self.channel_scales[ch].convert(block.analog_min[row, :count]))
+            columns.append(self.channel_scales[ch].convert(block.analog[row, :count]))
+        if self.digital_channels and not self._digital_events():
+            word = combine_ports(block.digital[0, :count], block.digital[1, :count])
+            word_min = combine_ports(block.digital_min[0, :count], block.digital_min[1, :count]) if self._aggregating() else None
+            if self.digital_format == "word":
+                mask = channel_mask(self.digital_channels)
+                if word_min is not None:
+                    columns.append(word_min & mask)
+                columns.append(word & mask)
+            elif word_min is not None:
+                columns.extend(unpack_bits_min_max(word_min, word, self.digital_channels))
+            else:
+                columns.extend(unpack_bits(word, self.digital_channels))
+        return columns
+
+    def encode_block(self, block):
+        """Format a RingBlock as CSV rows in one pass (see csv_encoder). Same columns as convert_block, written
+        at fixed precision; returns bytes.
+        """
+        count = block.count
+        columns = []
+        decimals = []
+        if self.time_column_enabled:
+            places = time_decimals(self.outputIntervalNs, self.time_unit)
+            columns.append(sample_times_fixed(block.first_sample, count, self.outputIntervalNs, self.time_unit,
+                                              places))
+            decimals.append(places)
+        for row, ch in enumerate(self.analog_channels):
+            scale = self.channel_scales[ch]
+            places = scale_decimals(scale) if self.csv_precision is None else self.csv_precision
+            if self._aggregating():
+                columns.append(to_fixed(scale.convert(block.analog_min[row, :count]), places))
+                decimals.append(places)
+            columns.append(to_fixed(scale.convert(block.analog[row, :count]), places))
+            decimals.append(places)
+        if self.digital_channels and not self._digital_events():
+            word = combine_ports(block.digital[0, :count], block.digital[1, :count])
+            word_min = combine_ports(block.digital_min[0, :count], block.digital_min[1, :count]) if self._aggregating() else None
+            if self.digital_format == "word":
+                mask = channel_mask(self.digital_channels)
+                if word_min is not None:
+                    columns.append(to_fixed(word_min & mask, 0))
+                    decimals.append(0)
+                columns.append(to_fixed(word & mask, 0))
+                decimals.append(0)
+            else:
+                if word_min is not None:
+                    bits = unpack_bits_min_max(word_min, word, self.digital_channels)
+                else:
+                    bits = unpack_bits(word, self.digital_channels)
+                columns.extend(to_fixed(row_bits, 0) for row_bits in bits)
+                decimals.extend([0] * len(bits))
+        return encode_rows(columns, decimals)
+
     def _has_digital_channels(self):
         """Check if the current driver supports digital channels."""
         # PS3000A has digital channels, PS4000A does not
@@ -584,54 +898,33 @@ class DataAcquisition:
 # Singleton instance for GUI use, now initialized without a driver
 _acquisition_instance = DataAcquisition(driver=None)
 
-def start_recording(time_unit="ms", sample_interval=0.25, channels={"A": True, "B": True, "C": False, "D": False}, filename="acquisition.csv", digital_channels=None):
+def start_recording(time_unit="ms", sample_interval=0.25, channels={"A": True, "B": True, "C": False, "D": False}, filename="acquisition.csv", digital_channels=None, output_format="csv", sizeOfOneBuffer="auto", downsample_mode="none", downsample_ratio=1, digital_format="bits", segment_samples=None, segment_bytes=None, segment_minutes=None, compression=None, compression_filter="bitshuffle", numBuffersToCapture=None, preallocate=False, block_times=False, time_column=True, csv_precision=None, fast_csv=True, total_samples=None):
     if _acquisition_instance.driver is None:
         raise RuntimeError("Scope driver not set. Please select a scope at startup.")
     _acquisition_instance.start_recording(
+        sizeOfOneBuffer=sizeOfOneBuffer,
         time_unit=time_unit,
         sample_interval=sample_interval,
         channels=channels,
         filename=filename,
-        digital_channels=digital_channels
+        digital_channels=digital_channels,
+        output_format=output_format,
+        downsample_mode=downsample_mode,
+        downsample_ratio=downsample_ratio,
+        digital_format=digital_format,
+        segment_samples=segment_samples,
+        segment_bytes=segment_bytes,
+        segment_minutes=segment_minutes,
+        compression=compression,
+        compression_filter=compression_filter,
+        numBuffersToCapture=numBuffersToCapture,
+        preallocate=preallocate,
+        block_times=block_times,
+        time_column=time_column,
+        csv_precision=csv_precision,
+        fast_csv=fast_csv,
+        total_samples=total_samples
     )
 
 def stop_recording():
     _acquisition_instance.stop_recording()
-
-class AcquisitionThread(QtCore.QThread):
-    def __init__(self, time_unit, sample_interval, channels, filename, digital_channels, voltage_rails=None, voltage_offsets=None):
-        super().__init__()
-        self.time_unit = time_unit
-        self.sample_interval = sample_interval
-        self.channels = channels
-        self.filename = filename
-        self.digital_channels = digital_channels
-        self.voltage_rails = voltage_rails or {}
-        self.voltage_offsets = voltage_offsets or {}
-
-    def run(self):
-        try:
-            # Set voltage range and offset for each channel before starting acquisition
-            for ch in self.voltage_rails:
-                range_value = self.voltage_rails[ch]
-                offset = self.voltage_offsets.get(ch, 0.0)
-                # Pass the string value - it will be converted in set_voltage_range
-                _acquisition_instance.set_voltage_range(ch, range_value, offset)
-            
-            # Add a 3.5-second startup delay to allow PicoScope to fully initialize
-            print("Initializing PicoScope... Please wait 3.5 seconds")
-            time.sleep(3.5)
-            print("Starting data acquisition...")
-            
-            start_recording(
-                time_unit=self.time_unit,
-                sample_interval=self.sample_interval,
-                channels=self.channels,
-                filename=self.filename,
-                digital_channels=self.digital_channels
-            )
-        except Exception:
-            log_path = os.path.join(os.getcwd(), "picoscope_crash.log")
-            with open(log_path, "a") as f:
-                f.write("=== Crash Detected in AcquisitionThread ===\n")
-                traceback.print_exc(file=f)
\ No newline at end of file
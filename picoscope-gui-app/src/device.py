@@ -10,9 +10,83 @@ from __future__ import print_function
 import collections
 import numpy
 import math
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import picosdk.constants as constants
 from picosdk.errors import DeviceCannotSegmentMemoryError, InvalidTimebaseError, ClosedDeviceError, \
-    NoChannelsEnabledError, NoValidTimebaseForOptionsError
+    NoChannelsEnabledError, NoValidTimebaseForOptionsError, InvalidCaptureParameters
+
+
+# capture_block always captures into the first (and only) memory segment.
+_BLOCK_SEGMENT_ID = 0
+
+# find_timebase results, see Device._timebase_cache_key
+_TIMEBASE_CACHE = {}
+
+
+def clear_timebase_cache():
+    """forget all timebases found by Device.find_timebase (e.g. after changing settings outside this module)."""
+    _TIMEBASE_CACHE.clear()
+
+
+class ChannelScale(object):
+    """counts -> volts conversion of one channel: volts = counts * factor - offset."""
+    def __init__(self, full_scale, max_adc, offset=0.0):
+        self.factor = float(full_scale) / max_adc
+        # the driver adds the analog offset to the input before digitising, so it is taken off again here.
+        self.offset = float(offset or 0.0)
+
+    def convert(self, counts, out=None, dtype=numpy.dtype('float64')):
+        """convert an array of counts in one pass, writing into `out` when given."""
+        result = numpy.multiply(counts, self.factor, out=out, dtype=dtype)
+        if self.offset:
+            numpy.subtract(result, self.offset, out=result)
+        return result
+
+
+class SampleTimes(object):
+    """times of `count` evenly spaced samples, start + i * interval, without storing them.
+    Behaves like a read-only 1-D array: len(), indexing and slicing only compute what is asked for, and
+    numpy.asarray(times) builds the full array on first use and keeps it."""
+    def __init__(self, start, interval, count, dtype=numpy.dtype('float32')):
+        self.start = start
+        self.interval = interval
+        self.count = int(count)
+        self.dtype = numpy.dtype(dtype)
+        self._array = None
+
+    @property
+    def shape(self):
+        return (self.count,)
+
+    def __len__(self):
+        return self.count
+
+    def _times(self, indexes):
+        return (self.start + numpy.asarray(indexes, dtype=numpy.float64) * self.interval).astype(self.dtype)
+
+    def __getitem__(self, key):
+        if self._array is not None:
+            return self._array[key]
+        if isinstance(key, slice):
+            return self._times(numpy.arange(*key.indices(self.count)))
+        if key < 0:
+            key += self.count
+        if not 0 <= key < self.count:
+            raise IndexError("sample index out of range")
+        return self._times(key)[()]
+
+    def __array__(self, dtype=None, copy=None):
+        if self._array is None:
+            self._array = self._times(numpy.arange(self.count))
+            self._array.flags.writeable = False
+        if dtype is not None and numpy.dtype(dtype) != self.dtype:
+            return self._array.astype(dtype)
+        return self._array
+
+    def __repr__(self):
+        return "SampleTimes(start=%s, interval=%s, count=%s)" % (self.start, self.interval, self.count)
 
 
 def requires_open(error_message="This operation requires a device to be connected."):
@@ -62,9 +136,29 @@ class Device(object):
         # if a channel is missing from here, it is disabled (or in an undefined state).
         self._channel_ranges = {}
         self._channel_offsets = {}
+        # counts -> volts conversion per enabled channel, rebuilt only when the channel is reconfigured.
+        self._channel_scales = {}
+        self._max_adc = None
+        # serial number and memory segment count, both part of the find_timebase cache key.
+        self._serial = None
+        self._memory_segments = None
+        self._max_samples_per_segment = None
+        # (time interval, number of samples) -> SampleTimes, see _sample_times.
+        self._sample_times_cache = {}
+        # download worker and the pending block ready callback of capture_block_async / capture_blocks.
+        self._executor = None
+        self._block_ready_callback = None
+        # the callback of the last cancelled capture_block_async, kept alive in case the driver still calls it.
+        self._abandoned_callback = None
+        # set while any capture is in flight, see _begin_capture.
+        self._capture_lock = threading.Lock()
+        self._capture_in_flight = False
 
     @requires_open("The device either did not initialise correctly or has already been closed.")
     def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
         self.driver.close_unit(self)
         self.handle = None
         self.is_open = False
@@ -86,6 +180,7 @@ class Device(object):
     @requires_open()
     def set_channel(self, channel_config):
         name = channel_config.name
+        self._channel_scales.pop(name, None)
         if not channel_config.enabled:
             self.driver.set_channel(self,
                                     channel_name=name,
@@ -123,6 +218,16 @@ class Device(object):
         for channel_config in channel_configs:
             self.set_channel(channel_config)
 
+    def _channel_scale(self, channel):
+        """The ChannelScale for an enabled channel, computed on first use after the channel was (re)configured."""
+        scale = self._channel_scales.get(channel)
+        if scale is None:
+            if self._max_adc is None:
+                self._max_adc = self.driver.maximum_value(self)
+            scale = ChannelScale(self._channel_ranges[channel], self._max_adc, self._channel_offsets[channel])
+            self._channel_scales[channel] = scale
+        return scale
+
     def _timebase_options_are_impossible(self, options):
         device_max_samples_possible = self.driver.MAX_MEMORY
         if options.no_of_samples is not None:
@@ -155,38 +260,94 @@ class Device(object):
                 return False
         return True
 
+    def _timebase_cache_key(self, timebase_options, segment_index):
+        if self._serial is None:
+            self._serial = self.info.serial
+        return (self.driver.name, self._serial, tuple(sorted(self._channel_ranges.keys())),
+                self._memory_segments, segment_index, timebase_options)
+
+    def _probe_timebase(self, timebase_id, timebase_options, segment_index):
+        """get_timebase for one id. returns (timebase_info, None), or (None, error) if the id is not valid."""
+        try:
+            return self.driver.get_timebase(self, timebase_id, 0, timebase_options.oversample, segment_index), None
+        except InvalidTimebaseError as e:
+            return None, e
+
+    @staticmethod
+    def _timebase_too_slow(timebase_options, timebase_info):
+        return (timebase_options.max_time_interval is not None and
+                timebase_info.time_interval > timebase_options.max_time_interval)
+
+    @staticmethod
+    def _timebase_long_enough(timebase_options, timebase_info):
+        """whether the timebase holds the requested samples / collection time (true from some id upwards)."""
+        return Device._validate_timebase(timebase_options._replace(max_time_interval=None), timebase_info)
+
     @requires_open()
-    def find_timebase(self, timebase_options):
-        timebase_id = 0
+    def find_timebase(self, timebase_options, segment_index=0):
+        """find the fastest timebase which satisfies timebase_options.
+        The time interval grows with the timebase id, so only max_time_interval rules out slow timebases while
+        no_of_samples and min_collection_time rule out fast ones. The first valid id is found by galloping up
+        from the fastest timebase, then bisecting. Results are remembered per device, enabled channels, memory
+        segmentation, segment and options, so repeated captures make no get_timebase calls at all."""
         # quickly validate that the request is not impossible.
         if self._timebase_options_are_impossible(timebase_options):
             raise NoValidTimebaseForOptionsError()
-        # TODO binary search?
-        last_error = None
-        found_one_good = False
-        while True:
-            try:
-                timebase_info = self.driver.get_timebase(self, timebase_id, 0, timebase_options.oversample)
-                found_one_good = True
-                if self._validate_timebase(timebase_options, timebase_info):
-                    return timebase_info
-            except InvalidTimebaseError as e:
-                if found_one_good:
-                    # we won't find a valid timebase.
-                    last_error = e
-                    break
-            timebase_id += 1
-        args = ()
-        if last_error is not None:
-            args = (last_error.args[0],)
-        raise NoValidTimebaseForOptionsError(*args)
+        key = self._timebase_cache_key(timebase_options, segment_index)
+        if key in _TIMEBASE_CACHE:
+            return _TIMEBASE_CACHE[key]
+
+        # The fastest timebases can be unavailable with many channels enabled: step up to the first one that exists.
+        max_id = self.driver.max_timebase_id()
+        low, low_info, last_error = 0, None, None
+        while low_info is None:
+            low_info, last_error = self._probe_timebase(low, timebase_options, segment_index)
+            if low_info is None:
+                low += 1
+                if low > max_id:
+                    raise NoValidTimebaseForOptionsError(*last_error.args[:1])
+
+        # Gallop: double the step until a timebase is long enough, or past the last valid timebase.
+        high, high_info, step = low, low_info, 1
+        while high_info is not None and not self._timebase_long_enough(timebase_options, high_info):
+            if self._timebase_too_slow(timebase_options, high_info):
+                # slower ones only get slower, and nothing up to here was long enough
+                raise NoValidTimebaseForOptionsError()
+            low = high
+            high = min(low + step, max_id)
+            step *= 2
+            high_info, last_error = self._probe_timebase(high, timebase_options, segment_index)
+            if high == max_id and high_info is not None and not self._timebase_long_enough(timebase_options,
+                                                                                            high_info):
+                raise NoValidTimebaseForOptionsError()
 
-    @requires_open()
-    def capture_block(self, timebase_options, channel_configs=()):
-        """device.capture_block(timebase_options, channel_configs)
-        timebase_options: TimebaseOptions object, specifying at least 1 constraint, and optionally oversample.
-        channel_configs: a collection of ChannelConfig objects. If present, will be passed to set_channels.
-        """
+        # Bisect (low, high]: low is too short, high is long enough or past the end.
+        while high - low > 1:
+            middle = (low + high) // 2
+            middle_info, middle_error = self._probe_timebase(middle, timebase_options, segment_index)
+            if middle_info is None or self._timebase_long_enough(timebase_options, middle_info):
+                high, high_info, last_error = middle, middle_info, middle_error
+            else:
+                low = middle
+
+        if high_info is None:
+            raise NoValidTimebaseForOptionsError(*last_error.args[:1])
+        if not self._validate_timebase(timebase_options, high_info):
+            raise NoValidTimebaseForOptionsError()
+        _TIMEBASE_CACHE[key] = high_info
+        return high_info
+
+    def _sample_times(self, time_interval, num_samples):
+        """the (lazy) time axis of a capture, shared by all captures with the same interval and length."""
+        key = (time_interval, num_samples)
+        times = self._sample_times_cache.get(key)
+        if times is None:
+            times = self._sample_times_cache[key] = SampleTimes(0., time_interval, num_samples)
+        return times
+
+    def _prepare_block(self, timebase_options, channel_configs, n_segments=1, null_trigger=True):
+        """set up channels, memory segments, timebase and (unless null_trigger is False) trigger for block captures.
+        returns (timebase_info, post_trigger_samples, pre_trigger_samples)."""
         # set_channel:
 
         if channel_configs:
@@ -196,12 +357,14 @@ class Device(object):
             raise NoChannelsEnabledError("We cannot capture any data if no channels are enabled.")
 
         # memory_segments:
-        USE_SEGMENT_ID=0
         try:
-            # always force the number of memory segments on the device to 1 before computing timebases for a one-off
-            # block capture.
-            max_samples_possible = self.driver.memory_segments(self, USE_SEGMENT_ID+1)
-            if timebase_options.no_of_samples is not None and timebase_options.no_of_samples > max_samples_possible.value:
+            # force the number of memory segments on the device before computing timebases. Re-segmenting drops the
+            # driver's buffer registrations, so it is skipped when the device is already segmented this way.
+            if self._memory_segments != n_segments:
+                self._max_samples_per_segment = self.driver.memory_segments(self, n_segments).value
+                self._memory_segments = n_segments
+            if (timebase_options.no_of_samples is not None and
+                    timebase_options.no_of_samples > self._max_samples_per_segment):
                 raise NoValidTimebaseForOptionsError()
         except DeviceCannotSegmentMemoryError:
             pass
@@ -215,7 +378,15 @@ class Device(object):
         if post_trigger_samples is None:
             post_trigger_samples = int(math.ceil(timebase_options.min_collection_time / timebase_info.time_interval))
 
-        self.driver.set_null_trigger(self)
+        if null_trigger:
+            self.driver.set_null_trigger(self)
+        return timebase_info, post_trigger_samples, pre_trigger_samples
+
+    def _arm_block(self, timebase_options, channel_configs, ready=None):
+        """set up and start one block capture. returns (timebase_info, post_trigger_samples, approx_time_busy)."""
+        timebase_info, post_trigger_samples, pre_trigger_samples = self._prepare_block(timebase_options,
+                                                                                       channel_configs,
+                                                                                       _BLOCK_SEGMENT_ID+1)
 
         # tell the device to capture something:
         approx_time_busy = self.driver.run_block(self,
@@ -223,32 +394,339 @@ class Device(object):
                                                  post_trigger_samples,
                                                  timebase_info.timebase_id,
                                                  timebase_options.oversample,
-                                                 USE_SEGMENT_ID)
+                                                 _BLOCK_SEGMENT_ID,
+                                                 ready=ready)
+        return timebase_info, post_trigger_samples, approx_time_busy
 
+    def _wait_for_block(self, approx_time_busy, give_up=None):
+        """poll until the device is ready. returns False if the give_up event was set first."""
         is_ready = self.driver.is_ready(self)
         while not is_ready:
+            if give_up is not None and give_up.is_set():
+                return False
             time.sleep(approx_time_busy / 5)
             is_ready = self.driver.is_ready(self)
+        return True
 
+    def _collect_block(self, timebase_info, post_trigger_samples, raw, out):
+        """download, stop and convert a block capture once the device is ready. returns capture_block's result."""
+        # pooled buffers: repeated captures with the same settings neither allocate nor re-register them. Raw
+        # counts are handed to the caller, so they get buffers of their own.
         raw_data, overflow_warnings = self.driver.get_values(self,
                                                              self._channel_ranges.keys(),
                                                              post_trigger_samples,
-                                                             USE_SEGMENT_ID)
+                                                             _BLOCK_SEGMENT_ID,
+                                                             pool=not raw)
 
         self.driver.stop(self)
 
-        times = numpy.linspace(0.,
-                               post_trigger_samples * timebase_info.time_interval,
-                               post_trigger_samples,
-                               dtype=numpy.dtype('float32'))
+        times = self._sample_times(timebase_info.time_interval, post_trigger_samples)
+
+        if raw:
+            return times, raw_data, overflow_warnings, {channel: self._channel_scale(channel) for channel in raw_data}
 
         voltages = {}
 
-        max_adc = self.driver.maximum_value(self)
         for channel, raw_array in raw_data.items():
-            array = raw_array.astype(numpy.dtype('float32'), casting='safe')
-            factor = self._channel_ranges[channel] / max_adc
-            array = array * factor
-            voltages[channel] = array
+            # one pass from counts to float32, straight into the output array.
+            voltages[channel] = self._channel_scale(channel).convert(raw_array,
+                                                                     out=out.get(channel) if out else None,
+                                                                     dtype=numpy.dtype('float32'))
 
         return times, voltages, overflow_warnings
+
+    @requires_open()
+    def capture_block(self, timebase_options, channel_configs=(), raw=False, out=None):
+        """device.capture_block(timebase_options, channel_configs)
+        timebase_options: TimebaseOptions object, specifying at least 1 constraint, and optionally oversample.
+        channel_configs: a collection of ChannelConfig objects. If present, will be passed to set_channels.
+        raw: return the int16 ADC counts instead of volts, plus a fourth value: {channel: ChannelScale}, whose
+            factor and offset (or convert()) turn the counts into volts.
+        out: optionally, {channel: float32 array of the capture length} to write the volts into.
+        returns: times (a SampleTimes: array-like, computed on demand), voltages ({channel: float32 array}) and
+            overflow_warnings.
+        """
+        self._begin_capture()
+        try:
+            timebase_info, post_trigger_samples, approx_time_busy = self._arm_block(timebase_options, channel_configs)
+            self._wait_for_block(approx_time_busy)
+            return self._collect_block(timebase_info, post_trigger_samples, raw, out)
+        finally:
+            self._end_capture()
+
+    def _begin_capture(self):
+        """claim the device for one capture. The driver, and the single block ready callback slot, can only serve one
+        capture at a time, so a second capture started while one is in flight is refused."""
+        with self._capture_lock:
+            if self._capture_in_flight:
+                raise InvalidCaptureParameters("a capture is already in progress on this device")
+            self._capture_in_flight = True
+
+    def _end_capture(self):
+        self._block_ready_callback = None
+        self._capture_in_flight = False
+
+    def _abandon_capture(self):
+        """stop a capture which failed or was cancelled. A failing stop must not hide the original error."""
+        try:
+            self.driver.stop(self)
+        except Exception:
+            pass
+        finally:
+            self._end_capture()
+
+    def _download_executor(self):
+        if self._executor is None:
+            # one worker: driver calls for this device never run concurrently with each other.
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="PicoDownload")
+        return self._executor
+
+    @requires_open()
+    def capture_block_async(self, timebase_options, channel_configs=(), raw=False, out=None):
+        """device.capture_block_async(timebase_options, channel_configs)
+        Like capture_block, but returns a concurrent.futures.Future as soon as the device is armed (in asyncio, await
+        asyncio.wrap_future(future)). The driver's block ready callback starts the download on a worker thread the
+        moment the capture completes, instead of polling is_ready; the Future then holds capture_block's result.
+        Drivers without a ready callback are polled on the worker thread instead.
+        Only one capture can be in flight per device: starting another capture before the Future is done raises
+        InvalidCaptureParameters. Cancelling the Future before the capture completes stops the device straight away
+        (on the worker thread) and frees it for the next capture.
+        """
+        self._begin_capture()
+        future = Future()
+        executor = self._download_executor()
+        block_ready_type = getattr(self.driver, "BlockReadyType", None)
+        # the callback can fire before run_block has even returned: the worker waits until the capture is armed.
+        # fail, collect and abandon all run on the single worker thread, so capture["over"] needs no lock.
+        capture = {"over": False}
+        armed = threading.Event()
+        cancel_requested = threading.Event()
+
+        def fail(error):
+            armed.wait()
+            if capture["over"]:
+                return
+            capture["over"] = True
+            self._abandon_capture()
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+        def collect():
+            armed.wait()
+            if "timebase_info" not in capture or capture["over"]:
+                return  # arming failed (the caller got the exception), or the capture was abandoned
+            if not future.set_running_or_notify_cancel():
+                abandon()
+                return
+            capture["over"] = True
+            try:
+                result = self._collect_block(capture["timebase_info"], capture["post_trigger_samples"], raw, out)
+            except Exception as e:
+                self._abandon_capture()
+                future.set_exception(e)
+                return
+            # free the device before the caller hears about the result, so it can start the next capture straight away.
+            self._end_capture()
+            future.set_result(result)
+
+        def abandon():
+            armed.wait()
+            if "timebase_info" not in capture or capture["over"]:
+                return
+            capture["over"] = True
+            # the driver may still hold the ready callback until it has stopped: keep it alive past _end_capture.
+            self._abandoned_callback = ready
+            self._abandon_capture()
+
+        def cancelled(done_future):
+            if done_future.cancelled():
+                cancel_requested.set()
+                executor.submit(abandon)
+
+        def block_ready(handle, status, parameter):
+            # runs on a driver thread: hand over to the worker straight away.
+            if status != self.driver.PICO_STATUS['PICO_OK']:
+                executor.submit(fail, InvalidCaptureParameters("block capture failed (%s)" %
+                                                               constants.pico_tag(status)))
+                return
+            executor.submit(collect)
+
+        ready = None
+        if block_ready_type is not None:
+            # ctypes must keep the C callback alive until the driver has called it.
+            ready = self._block_ready_callback = block_ready_type(block_ready)
+        try:
+            timebase_info, post_trigger_samples, approx_time_busy = self._arm_block(timebase_options, channel_configs,
+                                                                                     ready=ready)
+            capture.update(timebase_info=timebase_info, post_trigger_samples=post_trigger_samples)
+        except Exception:
+            self._end_capture()
+            raise
+        finally:
+            armed.set()
+        future.add_done_callback(cancelled)
+        if ready is None:
+            def poll_and_collect():
+                try:
+                    self._wait_for_block(approx_time_busy, give_up=cancel_requested)
+                except Exception as e:
+                    fail(e)
+                    return
+                collect()
+            executor.submit(poll_and_collect)
+        return future
+
+    @requires_open()
+    def capture_blocks(self, timebase_options, channel_configs=(), n_captures=None, raw=False):
+        """device.capture_blocks(timebase_options, channel_configs)
+        Capture blocks one after the other, as a generator. Each capture is armed with an overlapped download
+        (get_values_overlapped): the driver reads the data into the buffers itself as the capture completes, and the
+        next capture is armed before the previous one is handed over, so converting and processing a block overlaps
+        the next capture and the dead time between captures is little more than one run_block call.
+        Two memory segments and two sets of buffers are used in turn; a device which cannot segment its memory alternates
+        the buffers on one segment.
+        timebase_options: TimebaseOptions object, as for capture_block.
+        channel_configs: a collection of ChannelConfig objects. If present, will be passed to set_channels.
+        n_captures: number of captures, or None to capture until the generator is closed.
+        raw: yield the int16 ADC counts instead of volts, plus {channel: ChannelScale}, as capture_block does. The count
+            arrays are refilled by a later capture: copy them to keep them beyond the next iteration.
+        yields: times (SampleTimes), voltages ({channel: float32 array}) and overflow_warnings per capture.
+        """
+        self._begin_capture()
+        try:
+            # yield from: closing this generator also closes the inner one, which stops the device.
+            yield from self._capture_blocks(timebase_options, channel_configs, n_captures, raw)
+        finally:
+            self._end_capture()
+
+    def _capture_blocks(self, timebase_options, channel_configs, n_captures, raw):
+        self._memory_segments = None
+        timebase_info, post_trigger_samples, pre_trigger_samples = self._prepare_block(timebase_options,
+                                                                                       channel_configs,
+                                                                                       2)
+        segments = (0, 1) if self._memory_segments == 2 else (0, 0)
+
+        channels = list(self._channel_ranges.keys())
+        buffers = numpy.empty((2, len(channels), post_trigger_samples), dtype=numpy.dtype('int16'))
+        slots = [{channel: buffers[slot, i] for i, channel in enumerate(channels)} for slot in range(2)]
+        scales = {channel: self._channel_scale(channel) for channel in channels}
+        times = self._sample_times(timebase_info.time_interval, post_trigger_samples)
+
+        # the block ready callback only records the status and wakes this generator up.
+        block_ready_type = getattr(self.driver, "BlockReadyType", None)
+        ready_event = threading.Event()
+        ready_status = []
+
+        def block_ready(handle, status, parameter):
+            ready_status.append(status)
+            ready_event.set()
+
+        ready = None
+        if block_ready_type is not None:
+            # ctypes must keep the C callback alive for as long as the driver may call it.
+            ready = self._block_ready_callback = block_ready_type(block_ready)
+
+        def arm(slot):
+            ready_event.clear()
+            del ready_status[:]
+            # the download request must be in place before the capture starts.
+            values = self.driver.get_values_overlapped(self, channels, post_trigger_samples, segments[slot],
+                                                       buffers=slots[slot])
+            approx_time_busy = self.driver.run_block(self,
+                                                     pre_trigger_samples,
+                                                     post_trigger_samples,
+                                                     timebase_info.timebase_id,
+                                                     timebase_options.oversample,
+                                                     segments[slot],
+                                                     ready=ready)
+            return values, approx_time_busy
+
+        def wait(approx_time_busy):
+            if ready is None:
+                self._wait_for_block(approx_time_busy)
+                return
+            ready_event.wait()
+            if ready_status[0] != self.driver.PICO_STATUS['PICO_OK']:
+                raise InvalidCaptureParameters("block capture failed (%s)" % constants.pico_tag(ready_status[0]))
+
+        try:
+            slot = 0
+            values, approx_time_busy = arm(slot)
+            captured = 0
+            while n_captures is None or captured < n_captures:
+                wait(approx_time_busy)
+                completed = values
+                captured += 1
+                # re-arm straight away, into the other buffers, before this capture is converted or processed.
+                if n_captures is None or captured < n_captures:
+                    slot ^= 1
+                    values, approx_time_busy = arm(slot)
+
+                if raw:
+                    yield times, completed.buffers, completed.overflow_warnings(), scales
+                else:
+                    voltages = {channel: scales[channel].convert(raw_array, dtype=numpy.dtype('float32'))
+                                for channel, raw_array in completed.buffers.items()}
+                    yield times, voltages, completed.overflow_warnings()
+        finally:
+            # also runs when the caller closes the generator early: abandon the capture still in flight.
+            self.driver.stop(self)
+
+    @requires_open()
+    def capture_rapid_block(self, n_captures, timebase_options, channel_configs=(), null_trigger=True):
+        """device.capture_rapid_block(n_captures, timebase_options, channel_configs)
+        Capture n_captures blocks back to back (rapid block mode): the memory is split into n_captures segments, the
+        device is armed once and re-arms itself in hardware after each trigger, then all segments are read in one
+        bulk transfer.
+        timebase_options: TimebaseOptions object, as for capture_block (no_of_samples is per capture).
+        channel_configs: a collection of ChannelConfig objects. If present, will be passed to set_channels.
+        null_trigger: set the trigger to "none" (auto trigger), like capture_block. Pass False to keep a trigger which
+            was set up on the driver beforehand.
+        returns: times (SampleTimes, one capture), voltages ({channel: float32 array of shape (n_captures, samples)}),
+            trigger_offsets (float64 seconds per capture) and overflow_warnings ({channel: bool per capture}).
+        """
+        self._begin_capture()
+        try:
+            return self._capture_rapid_block(n_captures, timebase_options, channel_configs, null_trigger)
+        finally:
+            self._end_capture()
+
+    def _capture_rapid_block(self, n_captures, timebase_options, channel_configs, null_trigger):
+        # one memory segment per capture
+        timebase_info, post_trigger_samples, pre_trigger_samples = self._prepare_block(timebase_options,
+                                                                                       channel_configs,
+                                                                                       n_segments=n_captures,
+                                                                                       null_trigger=null_trigger)
+
+        self.driver.set_no_of_captures(self, n_captures)
+        try:
+            approx_time_busy = self.driver.run_block(self,
+                                                     pre_trigger_samples,
+                                                     post_trigger_samples,
+                                                     timebase_info.timebase_id,
+                                                     timebase_options.oversample,
+                                                     0)
+
+            # is_ready only reports ready once the last segment has been captured.
+            self._wait_for_block(approx_time_busy)
+
+            channels = list(self._channel_ranges.keys())
+            raw_data, overflow_warnings = self.driver.get_values_bulk(self,
+                                                                      channels,
+                                                                      post_trigger_samples,
+                                                                      0,
+                                                                      n_captures - 1)
+            trigger_offsets = self.driver.get_values_trigger_time_offset_bulk(self, 0, n_captures - 1)
+        finally:
+            self.driver.stop(self)
+            # later single block captures (run_block) expect one capture per run again.
+            self.driver.set_no_of_captures(self, 1)
+
+        times = self._sample_times(timebase_info.time_interval, post_trigger_samples)
+
+        voltages = {}
+
+        for channel, raw_array in raw_data.items():
+            voltages[channel] = self._channel_scale(channel).convert(raw_array, dtype=numpy.dtype('float32'))
+
+        return times, voltages, trigger_offsets, overflow_warnings
@@ -0,0 +1,41 @@
+import numpy as np
+
+# How digital lines are written: one 0/1 CSV column per line, one column with the 16-bit port word, or only
+# the transitions, in a separate events file (see digital_events)
+DIGITAL_FORMATS = ("bits", "word", "events")
+
+
+def combine_ports(port0, port1=None):
+    """Pack PORT0 (D0-D7) and PORT1 (D8-D15) sample arrays into one uint16 word per sample, D0 in bit 0."""
+    word = np.bitwise_and(port0, 0xFF, dtype=np.uint16)
+    if port1 is not None:
+        word |= np.left_shift(np.bitwise_and(port1, 0xFF, dtype=np.uint16), 8)
+    return word
+
+
+def channel_mask(channels):
+    """uint16 mask with the bit of every digital channel in `channels` set."""
+    mask = 0
+    for dch in channels:
+        mask |= 1 << dch
+    return np.uint16(mask)
+
+
+def unpack_bits(word, channels):
+    """Split 16-bit words into a (len(channels), n) uint8 matrix of 0/1, one row per digital channel.
+    All channels are extracted in one shift-and-mask broadcast instead of a pass per channel.
+    """
+    shifts = np.asarray(channels, dtype=np.uint16).reshape(-1, 1)
+    return ((word >> shifts) & 1).astype(np.uint8)
+
+
+def unpack_bits_min_max(word_min, word_max, channels):
+    """Bit rows of aggregated words in output column order: min then max of each digital channel."""
+    bits_min = unpack_bits(word_min, channels)
+    bits_max = unpack_bits(word_max, channels)
+    return np.stack((bits_min, bits_max), axis=1).reshape(2 * len(bits_max), -1)
+
+
+def unpack_ports(port0, port1, channels):
+    """Bit matrix for the given digital channels straight from the PORT0/PORT1 sample arrays."""
+    return unpack_bits(combine_ports(port0, port1), channels)
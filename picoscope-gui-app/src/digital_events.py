@@ -0,0 +1,132 @@
+import csv
+import os
+import numpy as np
+
+from digital import channel_mask, combine_ports, unpack_bits
+from scaling import index_times
+
+EVENT_HEADER_SAMPLE = "Sample"
+EVENT_HEADER_WORD = "Word (D15-D0)"
+EVENT_HEADER_CHANGED = "Changed"
+
+
+def events_path(filename):
+    """Path of the digital events file that accompanies a capture."""
+    return os.path.splitext(filename)[0] + ".events.csv"
+
+
+def find_transitions(word, previous=None):
+    """Positions in `word` where the value differs from the sample before it.
+    previous is the last word of the preceding block (None at the start of a recording, which makes the first
+    sample an event). Returns (positions, changed bits) as arrays.
+    """
+    before = np.empty_like(word)
+    if len(word):
+        before[1:] = word[:-1]
+        # With no previous block every line counts as changed at the first sample
+        before[0] = ~word[0] if previous is None else previous
+    changed = word ^ before
+    positions = np.flatnonzero(changed)
+    return positions, changed[positions]
+
+
+class DigitalEventLog:
+    """Writes only the transitions of the selected digital lines: one row per sample at which any of them changed,
+    with the sample index, its time, the new D15-D0 word and the bits that changed. The first row holds the state
+    at the first sample.
+    Blocks with digital_min rows (aggregate downsampling) contribute the min word and then the max word of every
+    sample, so a line that changed within one downsampled sample still shows up, as two rows at the same index.
+    """
+    def __init__(self, filename, channels, time_unit):
+        self.filename = filename
+        self.mask = channel_mask(channels)
+        self.time_unit = time_unit
+        self.sample_interval_ns = None
+        self.previous = None
+        self.events = 0
+        self.bytes_written = 0
+        self.eventfile = open(filename, mode='w', newline='')
+        self.csvwriter = csv.writer(self.eventfile)
+        self.csvwriter.writerow([EVENT_HEADER_SAMPLE, f'Time ({time_unit})', EVENT_HEADER_WORD, EVENT_HEADER_CHANGED])
+
+    def set_sample_interval(self, sample_interval_ns):
+        self.sample_interval_ns = sample_interval_ns
+
+    def write_block(self, block):
+        count = block.count
+        if count == 0:
+            return
+        word = combine_ports(block.digital[0, :count], block.digital[1, :count]) & self.mask
+        per_sample = 1
+        if len(block.digital_min):
+            word_min = combine_ports(block.digital_min[0, :count], block.digital_min[1, :count]) & self.mask
+            word = np.stack((word_min, word)).T.reshape(-1)
+            per_sample = 2
+        positions, changed = find_transitions(word, self.previous)
+        changed &= self.mask
+        self.previous = word[-1]
+        if len(positions):
+            indexes = positions // per_sample + block.first_sample
+            times = index_times(indexes, self.sample_interval_ns or 0, self.time_unit)
+            self.csvwriter.writerows(zip(indexes.tolist(), times.tolist(), word[positions].tolist(), changed.tolist()))
+            self.eventfile.flush()
+            self.events += len(positions)
+        self.bytes_written = self.eventfile.tell()
+
+    def close(self):
+        if self.eventfile:
+            self.eventfile.close()
+            self.eventfile = None
+            self.csvwriter = None
+
+
+class DigitalEventSink:
+    """Wraps an output sink: the digital ports of every block go to a DigitalEventLog, everything else to `sink`
+    (which should be set up without digital columns/ports).
+    """
+    def __init__(self, sink, events_filename, channels, time_unit):
+        self.sink = sink
+        self.events = DigitalEventLog(events_filename, channels, time_unit)
+
+    @property
+    def bytes_written(self):
+        return self.sink.bytes_written + self.events.bytes_written
+
+    def set_metadata(self, metadata):
+        self.events.set_sample_interval(metadata["sample_interval_ns"])
+        metadata = dict(metadata)
+        metadata["digital_events_file"] = os.path.basename(self.events.filename)
+        self.sink.set_metadata(metadata)
+
+    def write_block(self, block):
+        self.events.write_block(block)
+        self.sink.write_block(block)
+
+    def close(self):
+        try:
+            self.events.close()
+        finally:
+            self.sink.close()
+
+
+def read_events(filename):
+    """Load a digital events file (or the one next to a capture). Returns (sample indexes, words) as arrays."""
+    if not filename.endswith(".events.csv"):
+        filename = events_path(filename)
+    data = np.loadtxt(filename, delimiter=",", skiprows=1, dtype=np.int64, usecols=(0, 2), ndmin=2)
+    return data[:, 0], data[:, 1].astype(np.uint16)
+
+
+def expand_events(indexes, words, start, stop, step=1):
+    """D15-D0 word of every sample start, start + step, ... below stop, rebuilt from the transitions."""
+    samples = np.arange(start, stop, step, dtype=np.int64)
+    if len(indexes) == 0:
+        return np.zeros(len(samples), dtype=np.uint16)
+    # Each sample takes the word of the last event at or before it
+    positions = np.searchsorted(indexes, samples, side="right") - 1
+    return np.where(positions >= 0, words[np.maximum(positions, 0)], 0).astype(np.uint16)
+
+
+def expand_bits(indexes, words, channels, start, stop, step=1):
+    """Like expand_events, but split into one 0/1 row per digital channel."""
+    return unpack_bits(expand_events(indexes, words, start, stop, step), channels)
@@ -82,39 +82,16 @@ def splitMSOData(dataLength, data):
                         c_int16 array   data
                         )
     """
-    # Makes an array for each digital channel
-    binaryBufferD0 = np.chararray((dataLength.value, 1))
-    binaryBufferD1 = np.chararray((dataLength.value, 1))
-    binaryBufferD2 = np.chararray((dataLength.value, 1))
-    binaryBufferD3 = np.chararray((dataLength.value, 1))
-    binaryBufferD4 = np.chararray((dataLength.value, 1))
-    binaryBufferD7 = np.chararray((dataLength.value, 1))
-    binaryBufferD5 = np.chararray((dataLength.value, 1))
-    binaryBufferD6 = np.chararray((dataLength.value, 1))
-    
-    # Changes the data from int type to a binary type and then separates the data for each digital channel
-    for i in range(0, dataLength.value):
-        MSOData = data[i]
-        binaryMSOData = bin(MSOData)
-        binaryMSOData = binaryMSOData[2:]
-        binaryMSOData = binaryMSOData.zfill(8)
-        binaryBufferD0[i] = binaryMSOData[7]
-        binaryBufferD1[i] = binaryMSOData[6]
-        binaryBufferD2[i] = binaryMSOData[5]
-        binaryBufferD3[i] = binaryMSOData[4]
-        binaryBufferD4[i] = binaryMSOData[3]
-        binaryBufferD5[i] = binaryMSOData[2]
-        binaryBufferD6[i] = binaryMSOData[1]
-        binaryBufferD7[i] = binaryMSOData[0]
-
-    return binaryBufferD0, \
-           binaryBufferD1, \
-           binaryBufferD2, \
-           binaryBufferD3, \
-           binaryBufferD4, \
-           binaryBufferD5, \
-           binaryBufferD6, \
-           binaryBufferD7
+    # Extracts all eight bits at once, then stores them as '0'/'1' characters (D0 first) as before
+    samples = np.asarray(data)[:dataLength.value].astype(np.int64)
+    bits = (samples[:, np.newaxis] >> np.arange(8)) & 1
+    binaryBuffers = []
+    for j in range(8):
+        binaryBuffer = np.chararray((dataLength.value, 1))
+        binaryBuffer[:, 0] = np.where(bits[:, j], b'1', b'0')
+        binaryBuffers.append(binaryBuffer)
+
+    return tuple(binaryBuffers)
 
 
 def splitMSODataFast(dataLength, data):
@@ -130,23 +107,16 @@ def splitMSODataFast(dataLength, data):
                         c_int16 array   data
                         )
     """
-    # Makes an array for each digital channel
-    bufferBinaryDj = (
-        np.chararray(dataLength.value),
-        np.chararray(dataLength.value),
-        np.chararray(dataLength.value),
-        np.chararray(dataLength.value),
-        np.chararray(dataLength.value),
-        np.chararray(dataLength.value),
-        np.chararray(dataLength.value),
-        np.chararray(dataLength.value),
-    )
-    # Splits out the individual bits from the port into the binary values for each digital channel/pin.
-    for i in range(dataLength.value):
-        for j in range(8):
-            bufferBinaryDj[j][i] = 1 if (data[i] & (1 << (7-j))) else 0
-
-    return bufferBinaryDj
+    # Splits out the individual bits from the port for every sample in one pass, most significant bit first
+    samples = np.asarray(data)[:dataLength.value].astype(np.int64)
+    bits = (samples[:, np.newaxis] >> np.arange(7, -1, -1)) & 1
+    bufferBinaryDj = []
+    for j in range(8):
+        bufferBinaryD = np.chararray(dataLength.value)
+        bufferBinaryD[:] = np.where(bits[:, j], b'1', b'0')
+        bufferBinaryDj.append(bufferBinaryD)
+
+    return tuple(bufferBinaryDj)
 
 
 def assert_pico_ok(status):
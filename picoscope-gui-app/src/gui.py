@@ -1,7 +1,9 @@
 from PyQt5 import QtWidgets, QtCore
 import sys
 import time
-from data_acquisition import start_recording, stop_recording
+from data_acquisition import start_recording, stop_recording, _acquisition_instance
+from telemetry import format_snapshot
+from compression import available_codecs
 
 class ScopeSelectDialog(QtWidgets.QDialog):
     def __init__(self):
@@ -25,7 +27,9 @@ class AcquisitionThread(QtCore.QThread):
     countdown_update = QtCore.pyqtSignal(str)
     first_sample_signal = QtCore.pyqtSignal()  # Signal when first sample is actually recorded
     
-    def __init__(self, time_unit, sample_interval, channels, filename, digital_channels, voltage_rails, voltage_offsets):
+    def __init__(self, time_unit, sample_interval, channels, filename, digital_channels, voltage_rails, voltage_offsets,
+                 output_format="csv", downsample_mode="none", downsample_ratio=1, digital_format="bits",
+                 segment_limits=None, compression=None):
         super().__init__()
         self.time_unit = time_unit
         self.sample_interval = sample_interval
@@ -34,6 +38,12 @@ class AcquisitionThread(QtCore.QThread):
         self.digital_channels = digital_channels
         self.voltage_rails = voltage_rails
         self.voltage_offsets = voltage_offsets
+        self.output_format = output_format
+        self.downsample_mode = downsample_mode
+        self.downsample_ratio = downsample_ratio
+        self.digital_format = digital_format
+        self.segment_limits = segment_limits or {}  # segment_minutes / segment_bytes for start_recording
+        self.compression = compression
 
     def run(self):
         from data_acquisition import _acquisition_instance, start_recording
@@ -56,7 +66,13 @@ class AcquisitionThread(QtCore.QThread):
             sample_interval=self.sample_interval,
             channels=self.channels,
             filename=self.filename,
-            digital_channels=self.digital_channels
+            digital_channels=self.digital_channels,
+            output_format=self.output_format,
+            downsample_mode=self.downsample_mode,
+            downsample_ratio=self.downsample_ratio,
+            digital_format=self.digital_format,
+            compression=self.compression,
+            **self.segment_limits
         )
 
 class MainWindow(QtWidgets.QWidget):
@@ -82,6 +98,46 @@ class MainWindow(QtWidgets.QWidget):
         self.filename_input = QtWidgets.QLineEdit(self)
         self.filename_input.setPlaceholderText("Enter CSV filename (e.g. data.csv)")
 
+        # Output format: converted CSV or raw ADC counts with a JSON sidecar
+        self.format_combo = QtWidgets.QComboBox(self)
+        self.format_combo.addItem("CSV (mV)", "csv")
+        self.format_combo.addItem("Raw binary (.bin + .json)", "raw")
+
+        # Compression of raw output, per block so partial reads stay cheap
+        self.compression_combo = QtWidgets.QComboBox(self)
+        self.compression_combo.addItem("No compression", None)
+        self.compression_combo.addItem("Compress (best available)", "auto")
+        for codec in available_codecs():
+            self.compression_combo.addItem(f"Compress with {codec}", codec)
+        self.compression_combo.setEnabled(False)
+        self.format_combo.currentIndexChanged.connect(
+            lambda: self.compression_combo.setEnabled(self.format_combo.currentData() == "raw"))
+
+        # Hardware downsampling: the scope reduces every N samples to one before they are transferred
+        self.downsample_combo = QtWidgets.QComboBox(self)
+        self.downsample_combo.addItem("None", "none")
+        self.downsample_combo.addItem("Aggregate (min/max)", "aggregate")
+        self.downsample_combo.addItem("Average", "average")
+        self.downsample_combo.addItem("Decimate", "decimate")
+        self.downsample_ratio_spin = QtWidgets.QSpinBox(self)
+        self.downsample_ratio_spin.setRange(1, 1000000)
+        self.downsample_ratio_spin.setValue(100)
+        self.downsample_ratio_spin.setEnabled(False)
+        self.downsample_combo.currentIndexChanged.connect(
+            lambda: self.downsample_ratio_spin.setEnabled(self.downsample_combo.currentData() != "none"))
+
+        # Split long recordings into numbered files listed in a manifest
+        self.segment_combo = QtWidgets.QComboBox(self)
+        self.segment_combo.addItem("Single file", None)
+        self.segment_combo.addItem("New file every N minutes", "minutes")
+        self.segment_combo.addItem("New file every N MB", "megabytes")
+        self.segment_spin = QtWidgets.QSpinBox(self)
+        self.segment_spin.setRange(1, 1000000)
+        self.segment_spin.setValue(60)
+        self.segment_spin.setEnabled(False)
+        self.segment_combo.currentIndexChanged.connect(
+            lambda: self.segment_spin.setEnabled(self.segment_combo.currentData() is not None))
+
         # Channel checkboxes
         self.channel_a_checkbox = QtWidgets.QCheckBox("Channel A", self)
         self.channel_a_checkbox.setChecked(True)
@@ -160,6 +216,11 @@ class MainWindow(QtWidgets.QWidget):
                 cb.setChecked(False)
                 self.digital_checkboxes.append(cb)
                 self.digital_layout.addWidget(cb)
+            # How the selected lines are stored: a column per line, one 16-bit word column, or transitions only
+            self.digital_format_combo = QtWidgets.QComboBox(self)
+            self.digital_format_combo.addItem("One column per line", "bits")
+            self.digital_format_combo.addItem("One 16-bit word column", "word")
+            self.digital_format_combo.addItem("Transitions only (.events.csv)", "events")
         else:  # PS4000A - hide digital channels completely
             pass
 
@@ -171,6 +232,13 @@ class MainWindow(QtWidgets.QWidget):
         self.start_time = None
         self.recording_start_time = None
 
+        # Live acquisition telemetry (rate, queue depth, drops, over-range), refreshed once a second
+        self.stats_label = QtWidgets.QLabel("", self)
+        self.stats_label.setWordWrap(True)
+        self.stats_timer = QtCore.QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats)
+        self.stats_timer.setInterval(1000)
+
         self.start_button = QtWidgets.QPushButton("Start Recording", self)
         self.start_button.clicked.connect(self.start_recording)
 
@@ -185,6 +253,19 @@ class MainWindow(QtWidgets.QWidget):
         layout.addWidget(self.time_unit_combo)
         layout.addWidget(QtWidgets.QLabel("CSV filename:"))
         layout.addWidget(self.filename_input)
+        layout.addWidget(QtWidgets.QLabel("Output format:"))
+        layout.addWidget(self.format_combo)
+        layout.addWidget(self.compression_combo)
+        layout.addWidget(QtWidgets.QLabel("Downsampling (mode and ratio):"))
+        downsample_layout = QtWidgets.QHBoxLayout()
+        downsample_layout.addWidget(self.downsample_combo)
+        downsample_layout.addWidget(self.downsample_ratio_spin)
+        layout.addLayout(downsample_layout)
+        layout.addWidget(QtWidgets.QLabel("Split output:"))
+        segment_layout = QtWidgets.QHBoxLayout()
+        segment_layout.addWidget(self.segment_combo)
+        segment_layout.addWidget(self.segment_spin)
+        layout.addLayout(segment_layout)
         layout.addWidget(QtWidgets.QLabel("Select channels to record:"))
         channel_layout = QtWidgets.QHBoxLayout()
         channel_layout.addWidget(self.channel_a_checkbox)
@@ -203,9 +284,13 @@ class MainWindow(QtWidgets.QWidget):
         if self.model_index == 0:
             layout.addWidget(QtWidgets.QLabel("Select digital channels to record:"))
         layout.addLayout(self.digital_layout)
+        if self.model_index == 0:
+            layout.addWidget(QtWidgets.QLabel("Digital output:"))
+            layout.addWidget(self.digital_format_combo)
         
         layout.addWidget(self.initialization_label)
         layout.addWidget(self.timer_label)
+        layout.addWidget(self.stats_label)
         layout.addWidget(self.start_button)
         layout.addWidget(self.stop_button)
         self.setLayout(layout)
@@ -218,9 +303,21 @@ class MainWindow(QtWidgets.QWidget):
         except ValueError:
             QtWidgets.QMessageBox.warning(self, "Invalid Input", "Please enter a valid number for the sample interval.")
             return
+        output_format = self.format_combo.currentData()
+        downsample_mode = self.downsample_combo.currentData()
+        downsample_ratio = self.downsample_ratio_spin.value() if downsample_mode != "none" else 1
+        segment_limits = {}
+        if self.segment_combo.currentData() == "minutes":
+            segment_limits["segment_minutes"] = self.segment_spin.value()
+        elif self.segment_combo.currentData() == "megabytes":
+            segment_limits["segment_bytes"] = self.segment_spin.value() * 2**20
         filename = self.filename_input.text().strip()
         if not filename:
-            filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Select CSV file", "", "CSV Files (*.csv)")
+            if output_format == "raw":
+                filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Select raw capture file", "",
+                                                                    "Raw Capture Files (*.bin)")
+            else:
+                filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Select CSV file", "", "CSV Files (*.csv)")
             if not filename:
                 QtWidgets.QMessageBox.warning(self, "No filename", "You must enter a CSV filename before recording.")
                 return
@@ -235,15 +332,20 @@ class MainWindow(QtWidgets.QWidget):
         # Only get digital channels for PS3000A
         if self.model_index == 0:  # PS3000A
             digital_channels = [i for i, cb in enumerate(self.digital_checkboxes) if cb.isChecked()]
+            digital_format = self.digital_format_combo.currentData()
         else:  # PS4000A
             digital_channels = None  # No digital channels for PS4000A
+            digital_format = "bits"
 
         voltage_rails = {ch: self.rail_inputs[ch].currentText() for ch in "ABCD"}
         voltage_offsets = {ch: self.offset_inputs[ch].value() for ch in "ABCD"}
 
         self.acq_thread = AcquisitionThread(
             time_unit, sample_interval, channels, filename, digital_channels,
-            voltage_rails=voltage_rails, voltage_offsets=voltage_offsets
+            voltage_rails=voltage_rails, voltage_offsets=voltage_offsets, output_format=output_format,
+            downsample_mode=downsample_mode, downsample_ratio=downsample_ratio, digital_format=digital_format,
+            segment_limits=segment_limits,
+            compression=self.compression_combo.currentData() if output_format == "raw" else None
         )
         
         # Connect signals
@@ -266,6 +368,7 @@ class MainWindow(QtWidgets.QWidget):
         print("First sample recorded - starting timer")
         self.recording_start_time = QtCore.QTime.currentTime()
         self.timer.start()
+        self.stats_timer.start()
         self.initialization_label.setText("Recording in progress...")
 
     def stop_recording(self):
@@ -273,8 +376,13 @@ class MainWindow(QtWidgets.QWidget):
         self.start_button.setEnabled(True)
         self.stop_button.setEnabled(False)
         self.timer.stop()
+        self.stats_timer.stop()
+        self.update_stats()
         self.initialization_label.setText("")
 
+    def update_stats(self):
+        self.stats_label.setText(format_snapshot(_acquisition_instance.stats.snapshot()))
+
     def update_timer(self):
         if self.recording_start_time is not None:
             # Show time since first sample was recorded
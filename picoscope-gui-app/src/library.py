@@ -33,6 +33,19 @@ TimebaseInfo = collections.namedtuple('TimebaseInfo', ['timebase_id',
                                                        'segment_id'])
 
 
+class OverlappedValues(object):
+    """the buffers of a pending Library.get_values_overlapped request. The driver writes the sample count and overflow
+    flags into this object when the capture completes, so it must stay alive until then."""
+    def __init__(self, library, buffers, num_samples):
+        self._library = library
+        self.buffers = buffers
+        self.samples_collected = c_uint32(num_samples)
+        self.overflow = c_int16(0)
+
+    def overflow_warnings(self):
+        return self._library._overflow_warnings(self.overflow.value, self.buffers.keys())
+
+
 def requires_device(error_message="This method requires a Device instance registered to this Library instance."):
     def check_device_decorator(method):
         def check_device_impl(self, device, *args, **kwargs):
@@ -63,6 +76,12 @@ class Library(object):
         self.PICO_RATIO_MODE = {}
         self.PICO_THRESHOLD_DIRECTION = {}
 
+        # handle -> (key, buffers): the one set of get_values/get_values_bulk buffers kept for reuse (pool=True) per
+        # device, and the channels, size and segments they were allocated for.
+        self._buffer_pool = {}
+        # (handle, channel, segment) -> (address, length) of the buffer last registered with _set_data_buffer.
+        self._bound_buffers = {}
+
     def _load(self):
         library_path = find_library(self.name)
 
@@ -141,8 +160,18 @@ class Library(object):
 
     @requires_device("close_unit requires a picosdk.device.Device instance, passed to the correct owning driver.")
     def close_unit(self, device):
+        self.release_buffers(device)
         self._python_close_unit(device.handle)
 
+    def release_buffers(self, device):
+        """drop the pooled buffers of a device, and forget which buffers are registered with the driver."""
+        self._buffer_pool.pop(device.handle, None)
+        self._forget_bound_buffers(device)
+
+    def _forget_bound_buffers(self, device):
+        """the driver may drop buffer registrations when the memory is re-segmented: register them again next time."""
+        self._bound_buffers = {k: v for k, v in self._bound_buffers.items() if k[0] != device.handle}
+
     @requires_device("get_unit_info requires a picosdk.device.Device instance, passed to the correct owning driver.")
     def get_unit_info(self, device, *args):
         return self._python_get_unit_info_wrapper(device.handle, args)
@@ -369,6 +398,7 @@ class Library(object):
         if not hasattr(self, '_memory_segments'):
             raise DeviceCannotSegmentMemoryError()
         max_samples = c_int32(0)
+        self._forget_bound_buffers(device)
         status = self._memory_segments(c_int16(device.handle), c_uint32(number_segments), byref(max_samples))
         if status != self.PICO_STATUS['PICO_OK']:
             raise InvalidMemorySegmentsError("could not segment the device memory into (%s) segments (%s)" % (
@@ -391,6 +421,12 @@ class Library(object):
                             nanoseconds_result.max_samples,
                             nanoseconds_result.segment_id)
 
+    def max_timebase_id(self):
+        """the largest timebase id which can be passed to get_timebase on this driver."""
+        if len(self._get_timebase.argtypes) == 7 and self._get_timebase.argtypes[1] == c_int16:
+            return 2**15 - 1
+        return 2**32 - 1
+
     def _python_get_timebase(self, handle, timebase_id, no_of_samples, oversample, segment_index):
         # We use get_timebase on ps2000 and ps3000 and parse the nanoseconds-int into a float.
         # on other drivers, we use get_timebase2, which gives us a float in the first place.
@@ -455,19 +491,25 @@ class Library(object):
             raise NotImplementedError("not done other driver types yet")
 
     @requires_device()
-    def run_block(self, device, pre_trigger_samples, post_trigger_samples, timebase_id, oversample=1, segment_index=0):
+    def run_block(self, device, pre_trigger_samples, post_trigger_samples, timebase_id, oversample=1, segment_index=0,
+                  ready=None):
         """tell the device to arm any triggers and start capturing in block mode now.
+        ready: optionally, a BlockReadyType callback which the driver calls (on its own thread) when the capture is
+            complete. The caller must keep a reference to it until then.
         returns: the approximate time (in seconds) which the device will take to capture with these settings."""
         return self._python_run_block(device.handle,
                                       pre_trigger_samples,
                                       post_trigger_samples,
                                       timebase_id,
                                       oversample,
-                                      segment_index)
+                                      segment_index,
+                                      ready)
 
-    def _python_run_block(self, handle, pre_samples, post_samples, timebase_id, oversample, segment_index):
+    def _python_run_block(self, handle, pre_samples, post_samples, timebase_id, oversample, segment_index, ready=None):
         time_indisposed = c_int32(0)
         if len(self._run_block.argtypes) == 5:
+            if ready is not None:
+                raise NotImplementedError("this driver has no block ready callback")
             return_code = self._run_block(c_int16(handle),
                                           c_int32(pre_samples + post_samples),
                                           c_int16(timebase_id),
@@ -483,7 +525,19 @@ class Library(object):
                                      c_int16(oversample),
                                      byref(time_indisposed),
                                      c_uint32(segment_index),
-                                     None,
+                                     ready,
+                                     None)
+            if status != self.PICO_STATUS['PICO_OK']:
+                raise InvalidCaptureParameters("run_block failed (%s)" % constants.pico_tag(status))
+        elif len(self._run_block.argtypes) == 8:
+            # as above, without oversample (e.g. ps4000a).
+            status = self._run_block(c_int16(handle),
+                                     c_int32(pre_samples),
+                                     c_int32(post_samples),
+                                     c_uint32(timebase_id),
+                                     byref(time_indisposed),
+                                     c_uint32(segment_index),
+                                     ready,
                                      None)
             if status != self.PICO_STATUS['PICO_OK']:
                 raise InvalidCaptureParameters("run_block failed (%s)" % constants.pico_tag(status))
@@ -516,10 +570,52 @@ class Library(object):
         self._maximum_value(c_int16(device.handle), byref(max_adc))
         return max_adc.value
 
+    def _pooled_buffers(self, handle, key, shape, active_channels):
+        """{channel: int16 array of `shape`} from the device's pool. A device keeps one set only: a `key` other than
+        the pooled one allocates a new set (as one block) which replaces it."""
+        pooled = self._buffer_pool.get(handle)
+        if pooled is not None and pooled[0] == key:
+            return pooled[1]
+        block = numpy.empty((len(active_channels),) + shape, numpy.dtype('int16'))
+        buffers = {channel: block[i] for i, channel in enumerate(active_channels)}
+        self._buffer_pool[handle] = (key, buffers)
+        return buffers
+
+    def _register_data_buffer(self, handle, channel, array, num_samples, segment_index):
+        """_set_data_buffer, skipped if this exact buffer is still registered for the channel and segment."""
+        key = (handle, channel, segment_index)
+        binding = (array.ctypes.data, num_samples)
+        if self._bound_buffers.get(key) == binding:
+            return
+        # forget the old binding first, so a failed call never leaves a stale entry behind.
+        self._bound_buffers.pop(key, None)
+        status = self._set_data_buffer(c_int16(handle),
+                                       c_int32(self.PICO_CHANNEL[channel]),
+                                       array.ctypes.data,
+                                       c_int32(num_samples),
+                                       c_uint32(segment_index),
+                                       c_int32(self.PICO_RATIO_MODE.get('NONE', 0)))
+        if status != self.PICO_STATUS['PICO_OK']:
+            raise InvalidCaptureParameters("set_data_buffer failed (%s)" % constants.pico_tag(status))
+        self._bound_buffers[key] = binding
+
     @requires_device()
-    def get_values(self, device, active_channels, num_samples, segment_index=0):
-        # Initialise buffers to hold the data:
-        results = {channel: numpy.empty(num_samples, numpy.dtype('int16')) for channel in active_channels}
+    def get_values(self, device, active_channels, num_samples, segment_index=0, buffers=None, pool=False):
+        """retrieve num_samples per channel after a block capture.
+        buffers: optionally, {channel: int16 array of num_samples} to fill in place.
+        pool: reuse the device's pooled buffers while the channels, num_samples and segment_index stay the same,
+            instead of allocating new ones on every call. The returned arrays are then overwritten by the next call
+            with the same arguments. The device keeps one pooled set, so a call with other arguments replaces it.
+        Buffers which are still registered with the driver from an earlier call are not registered again."""
+        active_channels = list(active_channels)
+        if buffers is None and pool:
+            key = (tuple(active_channels), num_samples, segment_index)
+            buffers = self._pooled_buffers(device.handle, key, (num_samples,), active_channels)
+        if buffers is None:
+            # Initialise buffers to hold the data:
+            results = {channel: numpy.empty(num_samples, numpy.dtype('int16')) for channel in active_channels}
+        else:
+            results = {channel: buffers[channel] for channel in active_channels}
 
         overflow = c_int16(0)
 
@@ -540,34 +636,153 @@ class Library(object):
             # For this function pattern, we first call a function (self._set_data_buffer) to register each buffer. Then,
             # we can call self._get_values to actually populate them.
             for channel, array in results.items():
-                status = self._set_data_buffer(c_int16(device.handle),
-                                               c_int32(self.PICO_CHANNEL[channel]),
-                                               array.ctypes.data,
-                                               c_int32(num_samples),
-                                               c_uint32(segment_index),
-                                               c_int32(self.PICO_RATIO_MODE['NONE']))
-                if status != self.PICO_STATUS['PICO_OK']:
-                    raise InvalidCaptureParameters("set_data_buffer failed (%s)" % constants.pico_tag(status))
+                self._register_data_buffer(device.handle, channel, array, num_samples, segment_index)
 
             samples_collected = c_uint32(num_samples)
             status = self._get_values(c_int16(device.handle),
                                       c_uint32(0),
                                       byref(samples_collected),
                                       c_uint32(1),
-                                      c_int32(self.PICO_RATIO_MODE['NONE']),
+                                      c_int32(self.PICO_RATIO_MODE.get('NONE', 0)),
                                       c_uint32(segment_index),
                                       byref(overflow))
             if status != self.PICO_STATUS['PICO_OK']:
                 raise InvalidCaptureParameters("get_values failed (%s)" % constants.pico_tag(status))
 
+        return results, self._overflow_warnings(overflow.value, results.keys())
+
+    def _overflow_warnings(self, overflow, channels):
+        """{channel: True} for each of the channels whose bit is set in a driver overflow value."""
         overflow_warning = {}
-        if overflow.value:
-            for channel in results.keys():
-                if overflow.value & (1 >> self.PICO_CHANNEL[channel]):
+        if overflow:
+            for channel in channels:
+                if overflow & (1 << self.PICO_CHANNEL[channel]):
                     overflow_warning[channel] = True
+        return overflow_warning
 
+    @requires_device()
+    def get_values_overlapped(self, device, active_channels, num_samples, segment_index=0, buffers=None):
+        """ask the driver to download the next block capture into buffers as soon as it completes. Call this before
+        run_block: once is_ready (or the block ready callback) reports the capture, the data is already in place and
+        no get_values call is needed.
+        buffers: optionally, {channel: int16 array of num_samples} to fill (they are registered only if not already).
+        returns: an OverlappedValues, whose buffers, samples_collected and overflow_warnings() are valid once the
+            capture is complete."""
+        if not hasattr(self, '_get_values_overlapped') or len(self._get_values_overlapped.argtypes) != 7:
+            raise NotImplementedError("not done other driver types yet")
+        active_channels = list(active_channels)
+        if buffers is None:
+            buffers = {channel: numpy.empty(num_samples, numpy.dtype('int16')) for channel in active_channels}
+        for channel in active_channels:
+            self._register_data_buffer(device.handle, channel, buffers[channel], num_samples, segment_index)
+
+        values = OverlappedValues(self, {channel: buffers[channel] for channel in active_channels}, num_samples)
+        status = self._get_values_overlapped(c_int16(device.handle),
+                                             c_uint32(0),
+                                             byref(values.samples_collected),
+                                             c_uint32(1),
+                                             c_int32(self.PICO_RATIO_MODE.get('NONE', 0)),
+                                             c_uint32(segment_index),
+                                             byref(values.overflow))
+        if status != self.PICO_STATUS['PICO_OK']:
+            raise InvalidCaptureParameters("get_values_overlapped failed (%s)" % constants.pico_tag(status))
+        return values
+
+    @requires_device("set_no_of_captures requires a picosdk.device.Device instance, passed to the correct owning driver.")
+    def set_no_of_captures(self, device, number_captures):
+        """set how many captures the next run_block makes (rapid block mode), one per memory segment."""
+        if not hasattr(self, '_set_no_of_captures'):
+            raise DeviceCannotSegmentMemoryError()
+        self._forget_bound_buffers(device)
+        status = self._set_no_of_captures(c_int16(device.handle), c_uint32(number_captures))
+        if status != self.PICO_STATUS['PICO_OK']:
+            raise InvalidCaptureParameters("set_no_of_captures failed (%s)" % constants.pico_tag(status))
+
+    @requires_device()
+    def get_values_bulk(self, device, active_channels, num_samples, from_segment_index, to_segment_index,
+                        buffers=None, pool=False):
+        """retrieve num_samples from every segment in from_segment_index..to_segment_index (inclusive) after a rapid
+        block capture, in one driver call.
+        buffers: optionally, {channel: int16 array of shape (segments, num_samples)} to fill in place.
+        pool: reuse the buffers between calls with the same arguments, as for get_values.
+        returns: ({channel: int16 array, one row per segment}, {channel: bool array, True where that segment
+        overflowed}) - the second dict only lists channels which overflowed."""
+        if not hasattr(self, '_get_values_bulk') or len(self._get_values_bulk.argtypes) != 7:
+            raise NotImplementedError("not done other driver types yet")
+        active_channels = list(active_channels)
+        num_segments = to_segment_index - from_segment_index + 1
+        if buffers is None:
+            # one block of memory for all channels, handed out as a 2-D view per channel.
+            key = (tuple(active_channels), num_samples, from_segment_index, to_segment_index)
+            if pool:
+                buffers = self._pooled_buffers(device.handle, key, (num_segments, num_samples), active_channels)
+            else:
+                block = numpy.empty((len(active_channels), num_segments, num_samples), numpy.dtype('int16'))
+                buffers = {channel: block[i] for i, channel in enumerate(active_channels)}
+
+        for channel in active_channels:
+            for row in range(num_segments):
+                self._register_data_buffer(device.handle, channel, buffers[channel][row], num_samples,
+                                           from_segment_index + row)
+
+        overflow = numpy.zeros(num_segments, numpy.dtype('int16'))
+        samples_collected = c_uint32(num_samples)
+        status = self._get_values_bulk(c_int16(device.handle),
+                                       byref(samples_collected),
+                                       c_uint32(from_segment_index),
+                                       c_uint32(to_segment_index),
+                                       c_uint32(1),
+                                       c_int32(self.PICO_RATIO_MODE.get('NONE', 0)),
+                                       overflow.ctypes.data)
+        if status != self.PICO_STATUS['PICO_OK']:
+            raise InvalidCaptureParameters("get_values_bulk failed (%s)" % constants.pico_tag(status))
+
+        results = {channel: buffers[channel] for channel in active_channels}
+        overflow_warning = {}
+        for channel in active_channels:
+            flags = (overflow & (1 << self.PICO_CHANNEL[channel])) != 0
+            if flags.any():
+                overflow_warning[channel] = flags
         return results, overflow_warning
 
+    @requires_device()
+    def get_values_trigger_time_offset_bulk(self, device, from_segment_index, to_segment_index):
+        """the trigger time offsets (in seconds, from the sample the trigger was registered at) of the segments in
+        from_segment_index..to_segment_index (inclusive), as a float64 array."""
+        num_segments = to_segment_index - from_segment_index + 1
+        times = numpy.zeros(num_segments, numpy.dtype('int64'))
+        time_units = numpy.zeros(num_segments, numpy.dtype('int32'))
+        # prefer the 64 bit call, where the driver has both.
+        if hasattr(self, '_get_values_trigger_time_offset_bulk64'):
+            function = self._get_values_trigger_time_offset_bulk64
+        elif hasattr(self, '_get_values_trigger_time_offset_bulk'):
+            function = self._get_values_trigger_time_offset_bulk
+        else:
+            raise NotImplementedError("not done other driver types yet")
+        if len(function.argtypes) == 5:
+            status = function(c_int16(device.handle),
+                              times.ctypes.data,
+                              time_units.ctypes.data,
+                              c_uint32(from_segment_index),
+                              c_uint32(to_segment_index))
+        elif len(function.argtypes) == 6:
+            times_upper = numpy.zeros(num_segments, numpy.dtype('uint32'))
+            times_lower = numpy.zeros(num_segments, numpy.dtype('uint32'))
+            status = function(c_int16(device.handle),
+                              times_upper.ctypes.data,
+                              times_lower.ctypes.data,
+                              time_units.ctypes.data,
+                              c_uint32(from_segment_index),
+                              c_uint32(to_segment_index))
+            times[:] = ((times_upper.astype(numpy.uint64) << numpy.uint64(32)) | times_lower).view(numpy.int64)
+        else:
+            raise NotImplementedError("not done other driver types yet")
+        if status != self.PICO_STATUS['PICO_OK']:
+            raise InvalidCaptureParameters("get_values_trigger_time_offset_bulk failed (%s)" %
+                                           constants.pico_tag(status))
+        # time units count up from femtoseconds in steps of 1000.
+        return times * numpy.power(10.0, time_units * 3 - 15)
+
     @requires_device()
     def stop(self, device):
         if self._stop.restype == c_int16:
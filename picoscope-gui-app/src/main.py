@@ -2,10 +2,14 @@ from PyQt5.QtWidgets import QApplication
 import sys
 import os
 import ctypes
+import logging
 import traceback
 
 print("Starting PicoScope GUI Application...")
 
+# Acquisition progress and warnings are logged; show them on the console
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
 # Add picosdk to path when running as frozen executable
 if getattr(sys, 'frozen', False):
     # Running as compiled executable
@@ -0,0 +1,73 @@
+import time
+
+# Poll periods are kept inside these bounds (seconds). The upper bound also caps how stale the
+# data on disk and in the GUI can get during very slow logging.
+MIN_POLL_PERIOD = 0.0002
+MAX_POLL_PERIOD = 0.5
+
+
+class AdaptivePoller:
+    """Decides how long to wait between psGetStreamingLatestValues calls.
+
+    The starting period comes from the time the driver needs to fill `target_fill` of one buffer
+    (sizeOfOneBuffer * sample interval). After every poll the period is nudged so that each poll collects
+    about that many samples: it shrinks when polls come back fuller than the target (and the next poll happens
+    straight away when the buffer is past `high_water`), and it grows when polls come back empty.
+    """
+    def __init__(self, sample_interval_ns, buffer_size, target_fill=0.25, high_water=0.5,
+                 min_period=MIN_POLL_PERIOD, max_period=MAX_POLL_PERIOD):
+        self.buffer_size = buffer_size
+        self.target_samples = max(1.0, buffer_size * target_fill)
+        self.high_water_samples = buffer_size * high_water
+        self.min_period = min_period
+        self.max_period = max_period
+        self.period = self._clamp(self.target_samples * sample_interval_ns * 1e-9)
+        self.polls = 0
+        self.empty_polls = 0
+        self.immediate_polls = 0
+        self.samples = 0
+        self.max_samples_per_poll = 0
+        self.slept = 0.0
+
+    def _clamp(self, period):
+        return min(self.max_period, max(self.min_period, period))
+
+    def update(self, samples_received):
+        """Feed back the number of samples the last poll delivered. Returns the time to wait before the next one."""
+        self.polls += 1
+        self.samples += samples_received
+        self.max_samples_per_poll = max(self.max_samples_per_poll, samples_received)
+        if samples_received == 0:
+            self.empty_polls += 1
+            self.period = self._clamp(self.period * 1.25)
+            return self.period
+        # Move towards the period that would have collected target_samples, limited to halving/doubling per poll
+        ratio = min(2.0, max(0.5, self.target_samples / samples_received))
+        self.period = self._clamp(self.period * ratio ** 0.5)
+        if samples_received >= self.high_water_samples:
+            # The driver buffer is filling up: there is probably more waiting, fetch it now
+            self.immediate_polls += 1
+            return 0.0
+        return self.period
+
+    def wait(self, samples_received, stop_event=None):
+        """update() and then sleep for the chosen period; returns early if stop_event is set."""
+        delay = self.update(samples_received)
+        if delay > 0:
+            started = time.perf_counter()
+            if stop_event is not None:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+            self.slept += time.perf_counter() - started
+
+    def metrics(self):
+        return {
+            "poll_period_s": self.period,
+            "polls": self.polls,
+            "empty_polls": self.empty_polls,
+            "immediate_polls": self.immediate_polls,
+            "mean_samples_per_poll": self.samples / self.polls if self.polls else 0.0,
+            "max_samples_per_poll": self.max_samples_per_poll,
+            "poll_sleep_s": self.slept,
+        }
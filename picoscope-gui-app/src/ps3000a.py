@@ -707,6 +707,22 @@ ps3000a.StreamingReadyType = C_CALLBACK_FUNCTION_FACTORY(None,
 
 ps3000a.StreamingReadyType.__doc__ = doc
 
+doc = """ void *ps3000aBlockReady
+    (
+        int16_t      handle,
+        PICO_STATUS  status,
+        void        *pParameter
+    );
+    define a python function which accepts the correct arguments, and pass it to the constructor of this type.
+    """
+
+ps3000a.BlockReadyType = C_CALLBACK_FUNCTION_FACTORY(None,
+                                                     c_int16,
+                                                     c_uint32,
+                                                     c_void_p)
+
+ps3000a.BlockReadyType.__doc__ = doc
+
 doc = """ PICO_STATUS ps3000aNoOfStreamingValues
     (
         int16_t   handle,
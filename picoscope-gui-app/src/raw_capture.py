@@ -0,0 +1,207 @@
+import json
+import os
+import shutil
+import threading
+import numpy as np
+
+RAW_FORMAT_NAME = "picoscope-raw"
+RAW_FORMAT_VERSION = 1
+
+
+def sidecar_path(filename):
+    """Path of the JSON metadata file that accompanies a raw capture."""
+    return os.path.splitext(filename)[0] + ".json"
+
+
+def capture_dtype(analog_channels, digital_ports=0, with_min=False):
+    """Record layout of one sample: int16 per analog channel, then one uint16 word per digital port.
+    with_min adds an int16 "<ch>_min" field per analog channel and a uint16 "PORT<n>_min" field per digital port
+    for aggregate (min/max) downsampling.
+    Fields are little-endian so captures read the same on any machine.
+    """
+    fields = [(ch, "<i2") for ch in analog_channels]
+    if with_min:
+        fields += [(f"{ch}_min", "<i2") for ch in analog_channels]
+    fields += [(f"PORT{port}", "<u2") for port in range(digital_ports)]
+    if with_min:
+        fields += [(f"PORT{port}_min", "<u2") for port in range(digital_ports)]
+    return np.dtype(fields)
+
+
+class RawSink:
+    """Appends raw driver samples to a .bin file as interleaved records, with a JSON sidecar describing them.
+    Nothing is converted on the write path: each block is interleaved into a reused record buffer and written.
+    """
+    def __init__(self, filename, analog_channels, digital_ports, block_size, with_min=False):
+        self.filename = filename
+        self.dtype = capture_dtype(analog_channels, digital_ports, with_min)
+        self.analog_fields = list(analog_channels)
+        self.analog_min_fields = [f"{ch}_min" for ch in analog_channels] if with_min else []
+        self.digital_fields = [f"PORT{port}" for port in range(digital_ports)]
+        self.digital_min_fields = [f"PORT{port}_min" for port in range(digital_ports)] if with_min else []
+        self.records = np.zeros(block_size, dtype=self.dtype)
+        self.metadata = None
+        self.samples_written = 0
+        self.bytes_written = 0
+        self.rawfile = open(filename, mode='wb')
+
+    def set_metadata(self, metadata):
+        """Write the sidecar now, so a capture that is cut short can still be read back."""
+        self.metadata = dict(metadata)
+        self._write_sidecar()
+
+    def _write_sidecar(self):
+        metadata = dict(self.metadata)
+        metadata.update({
+            "format": RAW_FORMAT_NAME,
+            "version": RAW_FORMAT_VERSION,
+            "data_file": os.path.basename(self.filename),
+            "dtype": [[name, self.dtype.fields[name][0].str] for name in self.dtype.names],
+            "samples": self.samples_written,
+        })
+        with open(sidecar_path(self.filename), "w") as f:
+            json.dump(metadata, f, indent=2)
+
+    def _interleave(self, block):
+        # Gather the block's rows into the reused record buffer; returns the filled part
+        count = block.count
+        records = self.records[:count]
+        for row, name in enumerate(self.analog_fields):
+            records[name] = block.analog[row, :count]
+        for row, name in enumerate(self.analog_min_fields):
+            records[name] = block.analog_min[row, :count]
+        for row, name in enumerate(self.digital_fields):
+            records[name] = block.digital[row, :count]
+        for row, name in enumerate(self.digital_min_fields):
+            records[name] = block.digital_min[row, :count]
+        return records
+
+    def write_block(self, block):
+        count = block.count
+        records = self._interleave(block)
+        self.rawfile.write(records.tobytes())
+        self.samples_written += count
+        self.bytes_written += records.nbytes
+
+    def close(self):
+        if self.rawfile:
+            self.rawfile.close()
+            self.rawfile = None
+            if self.metadata is not None:
+                self._write_sidecar()
+
+
+class PreallocatedRawSink(RawSink):
+    """RawSink for captures of known length: the .bin file is allocated at its full size up front and mapped
+    into memory, and store() copies each driver slice straight to its final records with one slice assignment
+    per field. No write() call per block and no file growth, so the file does not fragment, and analysis
+    scripts can open it as a numpy.memmap while the capture runs (records not yet captured read as zeros).
+    store() is meant to be called from the driver callback; write_block() does the same for RingBlocks.
+    If the capture stops early the file is cut back to the samples actually stored.
+    """
+    def __init__(self, filename, analog_channels, digital_ports, total_samples, with_min=False):
+        self.filename = filename
+        self.dtype = capture_dtype(analog_channels, digital_ports, with_min)
+        self.analog_fields = list(analog_channels)
+        self.analog_min_fields = [f"{ch}_min" for ch in analog_channels] if with_min else []
+        self.digital_fields = [f"PORT{port}" for port in range(digital_ports)]
+        self.digital_min_fields = [f"PORT{port}_min" for port in range(digital_ports)] if with_min else []
+        self.total_samples = int(total_samples)
+        self.metadata = None
+        self.samples_written = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+        total_bytes = self.total_samples * self.dtype.itemsize
+        free_bytes = shutil.disk_usage(os.path.dirname(os.path.abspath(filename))).free
+        if total_bytes > free_bytes:
+            raise ValueError(f"Preallocating {total_bytes} bytes for {filename} needs more than the "
+                             f"{free_bytes} bytes free on disk")
+        self.rawfile = open(filename, mode='w+b')
+        if total_bytes:
+            if hasattr(os, "posix_fallocate"):
+                # Reserve real blocks now rather than a sparse file that is filled in piecemeal
+                os.posix_fallocate(self.rawfile.fileno(), 0, total_bytes)
+            else:
+                self.rawfile.truncate(total_bytes)
+            self.records = np.memmap(self.rawfile, dtype=self.dtype, mode='r+', shape=(self.total_samples,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def _write_sidecar(self):
+        self.metadata["preallocated_samples"] = self.total_samples
+        super()._write_sidecar()
+
+    def store(self, first_sample, analog_sources, digital_sources, start, count, analog_min_sources=(),
+              digital_min_sources=()):
+        """Copy buffer[start:start + count] of every source into records [first_sample, first_sample + count).
+        Returns the number of samples stored; samples beyond the preallocated length are not stored.
+        """
+        with self._lock:
+            if self.rawfile is None:
+                return 0
+            count = max(0, min(count, self.total_samples - first_sample))
+            if count == 0:
+                return 0
+            records = self.records[first_sample:first_sample + count]
+            end = start + count
+            for name, source in zip(self.analog_fields, analog_sources):
+                records[name] = source[start:end]
+            for name, source in zip(self.analog_min_fields, analog_min_sources):
+                records[name] = source[start:end]
+            for name, source in zip(self.digital_fields, digital_sources):
+                records[name] = source[start:end]
+            for name, source in zip(self.digital_min_fields, digital_min_sources):
+                records[name] = source[start:end]
+            self.samples_written = max(self.samples_written, first_sample + count)
+            self.bytes_written = self.samples_written * self.dtype.itemsize
+            return count
+
+    def write_block(self, block):
+        count = block.count
+        self.store(block.first_sample, block.analog[:, :count], block.digital[:, :count], 0, count,
+                   block.analog_min[:, :count], block.digital_min[:, :count])
+
+    def close(self):
+        with self._lock:
+            if self.rawfile is None:
+                return
+            if isinstance(self.records, np.memmap):
+                self.records.flush()
+            self.records = None
+            if self.samples_written < self.total_samples:
+                self.rawfile.truncate(self.bytes_written)
+            self.rawfile.close()
+            self.rawfile = None
+        if self.metadata is not None:
+            self._write_sidecar()
+
+
+def read_metadata(filename):
+    """Load the sidecar for a raw capture (either the .bin or the .json path may be given)."""
+    with open(sidecar_path(filename)) as f:
+        metadata = json.load(f)
+    if metadata.get("format") != RAW_FORMAT_NAME:
+        raise ValueError(f"{sidecar_path(filename)} is not a {RAW_FORMAT_NAME} sidecar")
+    return metadata
+
+
+def open_capture(filename, frames=None):
+    """Open a raw capture as a read-only numpy.memmap of records, plus its metadata.
+    Fields are named after the channels, e.g. data["A"], data["PORT0"], or data["A_min"] and data["PORT0_min"]
+    (aggregate captures).
+    Compressed captures come back as a compression.CompressedCapture, which slices the same way. Its frame index is
+    scanned from the file unless frames (the .frames of an earlier CompressedCapture of the same file) is given.
+    """
+    metadata = read_metadata(filename)
+    data_file = os.path.join(os.path.dirname(os.path.abspath(filename)), metadata["data_file"])
+    dtype = np.dtype([tuple(field) for field in metadata["dtype"]])
+    if metadata.get("compression"):
+        from compression import CompressedCapture
+        compression = metadata["compression"]
+        return CompressedCapture(data_file, dtype, compression["codec"], compression.get("filter"),
+                                 frames=frames), metadata
+    # Use the file size rather than the sidecar count, so a capture that is still running can be read
+    num_samples = os.path.getsize(data_file) // dtype.itemsize
+    if num_samples == 0:
+        return np.zeros(0, dtype=dtype), metadata
+    return np.memmap(data_file, dtype=dtype, mode='r', shape=(num_samples,)), metadata
@@ -0,0 +1,137 @@
+import threading
+from collections import deque
+import numpy as np
+
+# What BlockRing.push does when every block is still waiting to be written
+POLICY_BLOCK = "block"              # wait for the writer to free a block (back-pressure on the driver poll)
+POLICY_DROP_NEWEST = "drop_newest"  # discard the incoming driver data
+POLICY_DROP_OLDEST = "drop_oldest"  # discard the oldest block that has not been written yet
+FULL_POLICIES = (POLICY_BLOCK, POLICY_DROP_NEWEST, POLICY_DROP_OLDEST)
+
+
+class RingBlock:
+    """One preallocated block of raw driver samples.
+    analog holds one int16 row per enabled analog channel, digital one uint16 row per digital port.
+    analog_min and digital_min hold the matching min rows when the driver aggregates (one min/max pair per
+    downsampled sample). Only the first `count` columns are valid.
+    """
+    def __init__(self, slot, block_size, num_analog, num_digital, num_analog_min=0, num_digital_min=0):
+        self.slot = slot
+        self.analog = np.zeros((num_analog, block_size), dtype=np.int16)
+        self.analog_min = np.zeros((num_analog_min, block_size), dtype=np.int16)
+        self.digital = np.zeros((num_digital, block_size), dtype=np.uint16)
+        self.digital_min = np.zeros((num_digital_min, block_size), dtype=np.uint16)
+        self.first_sample = 0  # index of the first sample in the whole recording
+        self.count = 0
+
+
+class BlockRing:
+    """Bounded ring of preallocated blocks shared by the driver callback (producer) and the writer thread (consumer).
+    The callback only copies raw driver slices into a free block; nothing is allocated after construction.
+    """
+    def __init__(self, num_blocks, block_size, num_analog, num_digital=0, policy=POLICY_BLOCK, block_timeout=None,
+                 num_analog_min=0, num_digital_min=0):
+        if num_blocks < 2:
+            raise ValueError("BlockRing needs at least 2 blocks")
+        if policy not in FULL_POLICIES:
+            raise ValueError(f"Unknown ring full policy '{policy}', expected one of {FULL_POLICIES}")
+        self.block_size = block_size
+        self.policy = policy
+        # With POLICY_BLOCK, give up and drop the incoming data after this many seconds (None waits forever)
+        self.block_timeout = block_timeout
+        self._blocks = [RingBlock(i, block_size, num_analog, num_digital, num_analog_min, num_digital_min)
+                        for i in range(num_blocks)]
+        self._free = deque(self._blocks)
+        self._filled = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._closed = False
+        self.dropped_blocks = 0
+        self.dropped_samples = 0
+        self.max_depth = 0
+
+    @property
+    def capacity(self):
+        return len(self._blocks)
+
+    @property
+    def depth(self):
+        """Number of blocks waiting for the writer."""
+        with self._lock:
+            return len(self._filled)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _acquire_free_block(self, count):
+        # Called with the lock held. Returns a free block, or None if the incoming data must be dropped.
+        if not self._free:
+            if self.policy == POLICY_DROP_OLDEST and self._filled:
+                oldest = self._filled.popleft()
+                self.dropped_blocks += 1
+                self.dropped_samples += oldest.count
+                return oldest
+            if self.policy == POLICY_BLOCK:
+                self._not_full.wait_for(lambda: self._free or self._closed, timeout=self.block_timeout)
+            if not self._free or self._closed:
+                self.dropped_blocks += 1
+                self.dropped_samples += count
+                return None
+        return self._free.popleft()
+
+    def push(self, first_sample, analog_sources, digital_sources, start, count, analog_min_sources=(),
+             digital_min_sources=()):
+        """Copy buffer[start:start + count] of every source buffer into the next free block.
+        Called from the driver callback. Returns True if the block was queued, False if it was dropped.
+        """
+        if count > self.block_size:
+            raise ValueError(f"Cannot push {count} samples into blocks of {self.block_size}")
+        with self._lock:
+            if self._closed:
+                return False
+            block = self._acquire_free_block(count)
+            if block is None:
+                return False
+        # Copy outside the lock: nobody else can see this block until it is queued
+        end = start + count
+        for row, source in enumerate(analog_sources):
+            block.analog[row, :count] = source[start:end]
+        for row, source in enumerate(digital_sources):
+            block.digital[row, :count] = source[start:end]
+        for row, source in enumerate(analog_min_sources):
+            block.analog_min[row, :count] = source[start:end]
+        for row, source in enumerate(digital_min_sources):
+            block.digital_min[row, :count] = source[start:end]
+        block.first_sample = first_sample
+        block.count = count
+        with self._lock:
+            self._filled.append(block)
+            self.max_depth = max(self.max_depth, len(self._filled))
+            self._not_empty.notify()
+        return True
+
+    def pop(self, timeout=None):
+        """Take the oldest filled block. Returns None on timeout, or once the ring is closed and drained.
+        The caller must hand the block back with release() when it has been written.
+        """
+        with self._lock:
+            self._not_empty.wait_for(lambda: self._filled or self._closed, timeout=timeout)
+            if not self._filled:
+                return None
+            return self._filled.popleft()
+
+    def release(self, block):
+        """Return a written block to the free pool."""
+        with self._lock:
+            block.count = 0
+            self._free.append(block)
+            self._not_full.notify()
+
+    def close(self):
+        """Stop accepting data. Blocks already queued can still be popped."""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
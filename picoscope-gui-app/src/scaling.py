@@ -0,0 +1,93 @@
+import numpy as np
+
+# Full-scale voltage (in volts) for each range constant, shared by PS3000A and PS4000A
+VOLTAGE_RANGES = {
+    0: 0.01,    # 10mV
+    1: 0.02,    # 20mV
+    2: 0.05,    # 50mV
+    3: 0.1,     # 100mV
+    4: 0.2,     # 200mV
+    5: 0.5,     # 500mV
+    6: 1.0,     # 1V
+    7: 2.0,     # 2V
+    8: 5.0,     # 5V
+    9: 10.0,    # 10V
+    10: 20.0,   # 20V
+    11: 50.0,   # 50V
+    12: 100.0,  # 100V
+    13: 200.0,  # 200V
+}
+
+# Divisor that converts a time in nanoseconds to each selectable time unit
+TIME_UNIT_DIVISORS = {
+    "s": 1e9,
+    "ms": 1e6,
+    "us": 1e3,
+    "ns": None,  # already nanoseconds
+}
+
+
+class ChannelScale:
+    """Precomputed conversion of one channel's ADC counts: value = counts * factor - offset.
+    Results are in the units of full_scale and offset (mV for the logger and the raw converter).
+    Build it once when the channel is configured and reuse it for every block.
+    """
+    def __init__(self, full_scale, max_adc, offset=0.0):
+        if not max_adc:
+            raise ValueError("max_adc must be non-zero")
+        self.full_scale = float(full_scale)
+        self.max_adc = int(max_adc)
+        self.factor = self.full_scale / self.max_adc
+        # The driver adds the analogue offset to the input before digitising, so it is taken off again here
+        self.offset = float(offset or 0.0)
+        self._lookup_table = None
+
+    @classmethod
+    def for_range(cls, range_constant, max_adc, analogue_offset_v=0.0):
+        """Scale to mV for a range constant and analogue offset (V) as passed to psSetChannel.
+        Unknown range constants are treated as 20V, like DataAcquisition.adc_to_mv_single.
+        """
+        range_v = VOLTAGE_RANGES.get(range_constant, 20.0)
+        return cls(range_v * 1000.0, max_adc, (analogue_offset_v or 0.0) * 1000.0)
+
+    def convert(self, counts, out=None, dtype=np.float64):
+        """Convert an array of counts in one pass, writing into `out` when given."""
+        result = np.multiply(counts, self.factor, out=out, dtype=dtype)
+        if self.offset:
+            np.subtract(result, self.offset, out=result)
+        return result
+
+    def lookup_table(self):
+        """65536-entry float32 table indexed by the int16 count reinterpreted as uint16."""
+        if self._lookup_table is None:
+            counts = np.arange(65536, dtype=np.uint16).view(np.int16)
+            self._lookup_table = self.convert(counts, dtype=np.float32)
+        return self._lookup_table
+
+    def convert_lookup(self, counts, out=None):
+        """float32 conversion through the lookup table, one gather per sample."""
+        return np.take(self.lookup_table(), counts.view(np.uint16), out=out)
+
+    def to_dict(self):
+        return {"factor": self.factor, "offset": self.offset}
+
+
+def sample_times(first_sample, num_samples, sample_interval_ns, time_unit, step=1):
+    """Times of samples first_sample, first_sample + step, ... in the given time unit."""
+    divisor = TIME_UNIT_DIVISORS.get(time_unit, 1e6)  # default to milliseconds
+    if divisor is None:
+        # Nanoseconds stay integral
+        indexes = np.arange(first_sample, first_sample + num_samples * step, step, dtype=np.int64)
+        return indexes * int(sample_interval_ns)
+    times = np.arange(first_sample, first_sample + num_samples * step, step, dtype=np.float64) * sample_interval_ns
+    times /= divisor
+    return times
+
+
+def index_times(indexes, sample_interval_ns, time_unit):
+    """Times of arbitrary sample indexes in the given time unit (integral for nanoseconds, like sample_times)."""
+    divisor = TIME_UNIT_DIVISORS.get(time_unit, 1e6)
+    indexes = np.asarray(indexes, dtype=np.int64)
+    if divisor is None:
+        return indexes * int(sample_interval_ns)
+    return indexes * (sample_interval_ns / divisor)
@@ -1,4 +1,6 @@
 import ctypes
+import time
+import numpy as np
 
 class ScopeDriverBase:
     def __init__(self):
@@ -106,4 +108,260 @@ class PS4000ADriver(ScopeDriverBase):
         self.ps_NS = self.ps.PS4000A_TIME_UNITS["PS4000A_NS"]
 
     def open_unit(self, chandle):
-        return self.ps.ps4000aOpenUnit(chandle, None)
\ No newline at end of file
+        return self.ps.ps4000aOpenUnit(chandle, None)
+
+class SimulatedDriver(ScopeDriverBase):
+    """Stands in for the ps3000a/ps4000a DLL so the acquisition pipeline can run without a scope attached.
+    Implements the same ps* call surface used by DataAcquisition: synthetic waveforms are written into the
+    buffers registered with psSetDataBuffers at the requested sample rate, and psGetStreamingLatestValues calls
+    the StreamingReadyType callback the way the real driver does (contiguous runs, wrapping at the buffer end).
+
+    realtime: deliver samples at the requested rate (True) or a full buffer on every poll (False, to find the
+        maximum rate the host can absorb).
+    speed: multiplier on the requested rate in realtime mode.
+    amplitude: waveform peak as a fraction of full scale; above 1.0 the samples clip and overflow is flagged.
+    Downsampling (aggregate, average, decimate) is applied to the synthetic data the same way the driver does it,
+    aggregate filling both the max and the min buffer.
+    interval_step_ns: if set, psRunStreaming rounds the requested interval up to a multiple of this and writes
+        it back, like a scope whose timebase cannot hit the requested rate exactly.
+    """
+    PICO_OK = 0
+    PICO_INVALID_HANDLE = 0x0C
+    PICO_INVALID_PARAMETER = 0x0D
+
+    def __init__(self, realtime=True, speed=1.0, max_adc=32512, frequency_hz=50.0, amplitude=0.8, noise=0.0,
+                 digital=True, interval_step_ns=None):
+        super().__init__()
+        from ctypes_wrapper import C_CALLBACK_FUNCTION_FACTORY
+        self.StreamingReadyType = C_CALLBACK_FUNCTION_FACTORY(
+            None, ctypes.c_int16, ctypes.c_int32, ctypes.c_uint32, ctypes.c_int16, ctypes.c_uint32, ctypes.c_int16, ctypes.c_int16, ctypes.c_void_p
+        )
+        self.realtime = realtime
+        self.speed = speed
+        self.max_adc = max_adc
+        self.frequency_hz = frequency_hz
+        self.amplitude = amplitude
+        self.noise = noise
+        self.interval_step_ns = interval_step_ns
+
+        # Function aliases, same names as the real drivers
+        self.psOpenUnit = self._open_unit
+        self.psChangePowerSource = self._change_power_source
+        self.psMaximumValue = self._maximum_value
+        self.psSetChannel = self._set_channel
+        self.psSetDataBuffers = self._set_data_buffers
+        self.psRunStreaming = self._run_streaming
+        self.psGetStreamingLatestValues = self._get_streaming_latest_values
+        self.psStop = self._stop
+        self.psCloseUnit = self._close_unit
+
+        # Constants, laid out like the PS3000A enums
+        self.ps_CHANNEL = {f"PS3000A_CHANNEL_{ch}": i for i, ch in enumerate("ABCD")}
+        self.ps_RANGE = {name: i for i, name in enumerate([
+            "PS3000A_10MV", "PS3000A_20MV", "PS3000A_50MV", "PS3000A_100MV", "PS3000A_200MV", "PS3000A_500MV",
+            "PS3000A_1V", "PS3000A_2V", "PS3000A_5V", "PS3000A_10V", "PS3000A_20V", "PS3000A_50V"])}
+        self.ps_COUPLING = {"PS3000A_AC": 0, "PS3000A_DC": 1}
+        self.ps_RATIO_MODE = {
+            "PS3000A_RATIO_MODE_NONE": 0,
+            "PS3000A_RATIO_MODE_AGGREGATE": 1,
+            "PS3000A_RATIO_MODE_DECIMATE": 2,
+            "PS3000A_RATIO_MODE_AVERAGE": 4,
+        }
+        self.ps_TIME_UNITS = {"PS3000A_FS": 0, "PS3000A_PS": 1, "PS3000A_NS": 2, "PS3000A_US": 3, "PS3000A_MS": 4,
+                              "PS3000A_S": 5}
+        self.ps_CHANNEL_A = 0
+        self.ps_CHANNEL_B = 1
+        self.ps_CHANNEL_C = 2
+        self.ps_CHANNEL_D = 3
+        if digital:
+            self.ps_DIGITAL_PORT0 = 0x80
+            self.ps_DIGITAL_PORT1 = 0x81
+        self.ps_20V = self.ps_RANGE["PS3000A_20V"]
+        self.ps_2V = self.ps_RANGE["PS3000A_2V"]
+        self.ps_DC = self.ps_COUPLING["PS3000A_DC"]
+        self.ps_US = self.ps_TIME_UNITS["PS3000A_US"]
+        self.ps_NS = self.ps_TIME_UNITS["PS3000A_NS"]
+        self._time_unit_seconds = {0: 1e-15, 1: 1e-12, 2: 1e-9, 3: 1e-6, 4: 1e-3, 5: 1.0}
+
+        self.handle = 0
+        self.channels = {}  # channel -> (enabled, coupling, range, offset)
+        self.buffers = {}  # source -> numpy view of the registered max buffer
+        self.min_buffers = {}  # source -> numpy view of the registered min buffer (aggregate mode)
+        self.streaming = False
+        self.samples_delivered = 0
+        self.samples_lost = 0  # samples that were due but did not fit in the overview buffer
+        self.callbacks = 0
+
+    def open_unit(self, chandle):
+        return self._open_unit(chandle, None)
+
+    def _check_handle(self, handle):
+        value = handle.value if isinstance(handle, ctypes.c_int16) else handle
+        return value == self.handle and self.handle > 0
+
+    def _open_unit(self, chandle_ref, serial):
+        self.handle = 1
+        chandle_ref._obj.value = self.handle
+        return self.PICO_OK
+
+    def _change_power_source(self, handle, power_state):
+        return self.PICO_OK
+
+    def _maximum_value(self, handle, value_ref):
+        if not self._check_handle(handle):
+            return self.PICO_INVALID_HANDLE
+        value_ref._obj.value = self.max_adc
+        return self.PICO_OK
+
+    def _set_channel(self, handle, channel, enabled, coupling, channel_range, analogue_offset):
+        if not self._check_handle(handle):
+            return self.PICO_INVALID_HANDLE
+        self.channels[channel] = (bool(enabled), coupling, channel_range, analogue_offset)
+        return self.PICO_OK
+
+    def _set_data_buffers(self, handle, source, buffer_max, buffer_min, buffer_length, segment_index, ratio_mode):
+        if not self._check_handle(handle):
+            return self.PICO_INVALID_HANDLE
+        if buffer_max is None or buffer_length <= 0:
+            return self.PICO_INVALID_PARAMETER
+        self.buffers[source] = np.ctypeslib.as_array(buffer_max, shape=(buffer_length,))
+        if buffer_min is not None:
+            self.min_buffers[source] = np.ctypeslib.as_array(buffer_min, shape=(buffer_length,))
+        else:
+            self.min_buffers.pop(source, None)
+        return self.PICO_OK
+
+    def _run_streaming(self, handle, sample_interval_ref, time_units, max_pre_trigger_samples,
+                       max_post_trigger_samples, auto_stop, downsample_ratio, ratio_mode, overview_buffer_size):
+        if not self._check_handle(handle):
+            return self.PICO_INVALID_HANDLE
+        if not self.buffers or overview_buffer_size <= 0:
+            return self.PICO_INVALID_PARAMETER
+        interval = sample_interval_ref._obj.value
+        if interval <= 0:
+            return self.PICO_INVALID_PARAMETER
+        if self.interval_step_ns:
+            unit_ns = self._time_unit_seconds[time_units] * 1e9
+            step = self.interval_step_ns / unit_ns
+            interval = max(1, int(-(-interval // step) * step))
+            sample_interval_ref._obj.value = interval
+        self.sample_interval_s = interval * self._time_unit_seconds[time_units]
+        self.ratio_mode = ratio_mode
+        self.downsample_ratio = max(1, downsample_ratio) if ratio_mode != self.ps_RATIO_MODE["PS3000A_RATIO_MODE_NONE"] else 1
+        if ratio_mode == self.ps_RATIO_MODE["PS3000A_RATIO_MODE_AGGREGATE"] and set(self.min_buffers) != set(self.buffers):
+            return self.PICO_INVALID_PARAMETER  # aggregate needs a min buffer for every source
+        # Samples handed to the callback are downsample_ratio hardware samples apart
+        self.output_interval_s = self.sample_interval_s * self.downsample_ratio
+        self.total_samples = (max_pre_trigger_samples + max_post_trigger_samples) // self.downsample_ratio
+        self.auto_stop = bool(auto_stop)
+        self.overview_buffer_size = overview_buffer_size
+        self.buffer_length = min(len(buffer) for buffer in self.buffers.values())
+        self._prepare_waveforms()
+        self.write_index = 0
+        self.samples_delivered = 0
+        self.samples_lost = 0
+        self.callbacks = 0
+        self.start_time = time.perf_counter()
+        self.streaming = True
+        return self.PICO_OK
+
+    def _prepare_waveforms(self):
+        # One period table per source, indexed modulo its length while streaming
+        samples_per_period = max(8, int(round(1.0 / (self.frequency_hz * self.sample_interval_s))))
+        self.table_length = min(samples_per_period, 1 << 20)
+        phase = np.arange(self.table_length) * (2 * np.pi / self.table_length)
+        rng = np.random.default_rng(0)
+        self.tables = {}
+        for source in self.buffers:
+            if source >= 0x80:
+                continue
+            wave = self.amplitude * np.sin(phase + source * np.pi / 2)
+            if self.noise:
+                wave = wave + rng.normal(0.0, self.noise, self.table_length)
+            self.tables[source] = np.clip(np.round(wave * self.max_adc), -self.max_adc, self.max_adc).astype(np.int16)
+        self.clips = self.amplitude > 1.0
+
+    def _source_values(self, source, indexes):
+        if source >= 0x80:
+            # Digital ports: a binary counter, PORT1 counting 256x slower than PORT0
+            shift = 8 * (source - 0x80)
+            return ((indexes >> shift) & 0xFF).astype(np.uint16)
+        return np.take(self.tables[source], indexes % self.table_length)
+
+    def _fill(self, start, count):
+        # Write samples [samples_delivered, samples_delivered + count) into buffer[start:start + count]
+        end = start + count
+        ratio = self.downsample_ratio
+        if ratio == 1:
+            indexes = np.arange(self.samples_delivered, self.samples_delivered + count, dtype=np.int64)
+            for source, buffer in self.buffers.items():
+                buffer[start:end] = self._source_values(source, indexes)
+            return
+        # One row of `ratio` hardware samples per delivered sample
+        first = self.samples_delivered * ratio
+        indexes = np.arange(first, first + count * ratio, dtype=np.int64).reshape(count, ratio)
+        for source, buffer in self.buffers.items():
+            values = self._source_values(source, indexes)
+            digital = source >= 0x80
+            if self.ratio_mode == self.ps_RATIO_MODE["PS3000A_RATIO_MODE_AGGREGATE"]:
+                if digital:
+                    buffer[start:end] = np.bitwise_or.reduce(values, axis=1)
+                    self.min_buffers[source][start:end] = np.bitwise_and.reduce(values, axis=1)
+                else:
+                    buffer[start:end] = values.max(axis=1)
+                    self.min_buffers[source][start:end] = values.min(axis=1)
+            elif self.ratio_mode == self.ps_RATIO_MODE["PS3000A_RATIO_MODE_AVERAGE"] and not digital:
+                buffer[start:end] = np.round(values.mean(axis=1))
+            else:
+                buffer[start:end] = values[:, 0]
+
+    def _get_streaming_latest_values(self, handle, callback, parameter):
+        if not self._check_handle(handle):
+            return self.PICO_INVALID_HANDLE
+        if not self.streaming:
+            return self.PICO_OK
+        remaining = self.total_samples - self.samples_delivered
+        if self.realtime:
+            elapsed = time.perf_counter() - self.start_time
+            due = int(elapsed * self.speed / self.output_interval_s) - self.samples_delivered - self.samples_lost
+            if due > self.overview_buffer_size:
+                # The host did not poll fast enough; the oldest samples are gone
+                self.samples_lost += due - self.overview_buffer_size
+                due = self.overview_buffer_size
+        else:
+            due = self.buffer_length
+        due = min(due, remaining)
+        if due <= 0:
+            return self.PICO_OK
+
+        # The driver only delivers contiguous runs, so stop at the end of the buffer and wrap on the next poll
+        count = min(due, self.buffer_length - self.write_index)
+        start = self.write_index
+        self._fill(start, count)
+        self.samples_delivered += count
+        self.write_index = (self.write_index + count) % self.buffer_length
+        auto_stop = 1 if self.auto_stop and self.samples_delivered >= self.total_samples else 0
+        overflow = 0
+        if self.clips:
+            for source in self.tables:
+                overflow |= 1 << source
+        self.callbacks += 1
+        callback(self.handle, count, start, overflow, 0, 0, auto_stop, parameter)
+        if auto_stop:
+            self.streaming = False
+        return self.PICO_OK
+
+    def _stop(self, handle):
+        if not self._check_handle(handle):
+            return self.PICO_INVALID_HANDLE
+        self.streaming = False
+        return self.PICO_OK
+
+    def _close_unit(self, handle):
+        if not self._check_handle(handle):
+            return self.PICO_INVALID_HANDLE
+        self.streaming = False
+        self.handle = 0
+        self.buffers = {}
+        self.min_buffers = {}
+        return self.PICO_OK
@@ -0,0 +1,161 @@
+import json
+import os
+import time
+
+MANIFEST_FORMAT_NAME = "picoscope-segments"
+MANIFEST_FORMAT_VERSION = 1
+
+
+def manifest_path(filename):
+    """Path of the manifest that lists the segments of a recording."""
+    return os.path.splitext(filename)[0] + ".manifest.json"
+
+
+def segment_path(filename, index):
+    """File name of segment `index` (1-based): capture.csv -> capture_0001.csv."""
+    base, ext = os.path.splitext(filename)
+    return f"{base}_{index:04d}{ext}"
+
+
+class BlockSlice:
+    """Columns [start, stop) of a RingBlock, laid out like a RingBlock so any sink can write it."""
+    def __init__(self, block, start, stop):
+        self.slot = block.slot
+        self.analog = block.analog[:, start:stop]
+        self.analog_min = block.analog_min[:, start:stop]
+        self.digital = block.digital[:, start:stop]
+        self.digital_min = block.digital_min[:, start:stop]
+        self.first_sample = block.first_sample + start
+        self.count = stop - start
+
+
+class SegmentedSink:
+    """Splits a recording over numbered files, rolling over after max_samples samples, max_bytes bytes or
+    max_seconds seconds per segment (whichever comes first).
+
+    open_sink(filename) must return a new sink for one segment. It runs on the writer thread, so a rollover
+    never holds up the driver callback. Sample indexes, and so the time column, carry on across segments.
+    Each segment's metadata gets its first_sample. A JSON manifest next to the segments lists them all and is
+    rewritten at every rollover. A sample limit is exact: a block that straddles it is split between the two
+    segments. Byte and time limits take effect at the next block boundary.
+    """
+    def __init__(self, open_sink, filename, max_samples=None, max_bytes=None, max_seconds=None):
+        if not (max_samples or max_bytes or max_seconds):
+            raise ValueError("SegmentedSink needs at least one of max_samples, max_bytes or max_seconds")
+        self.open_sink = open_sink
+        self.filename = filename
+        self.max_samples = max_samples
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.manifest_file = manifest_path(filename)
+        self.metadata = None
+        self.segments = []
+        self.sink = None
+        self.segment = None
+        self._closed_bytes = 0
+        self._open_segment(0)
+
+    @property
+    def bytes_written(self):
+        return self._closed_bytes + (self.sink.bytes_written if self.sink else 0)
+
+    def _open_segment(self, first_sample):
+        index = len(self.segments) + 1
+        filename = segment_path(self.filename, index)
+        self.sink = self.open_sink(filename)
+        self.segment = {
+            "index": index,
+            "file": os.path.basename(getattr(self.sink, "filename", filename)),
+            "first_sample": first_sample,
+            "samples": 0,
+            "bytes": 0,
+            "opened": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "closed": None,
+        }
+        self.segments.append(self.segment)
+        self._segment_started = time.monotonic()
+        if self.metadata is not None:
+            self.sink.set_metadata(self._segment_metadata())
+        self._write_manifest()
+
+    def _close_segment(self):
+        if self.sink is None:
+            return
+        self.sink.close()
+        self.segment["bytes"] = self.sink.bytes_written
+        self.segment["closed"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        self._closed_bytes += self.sink.bytes_written
+        self.sink = None
+
+    def _segment_metadata(self):
+        metadata = dict(self.metadata)
+        metadata.update({
+            "segment": self.segment["index"],
+            "first_sample": self.segment["first_sample"],
+            "manifest": os.path.basename(self.manifest_file),
+        })
+        return metadata
+
+    def _write_manifest(self):
+        manifest = {
+            "format": MANIFEST_FORMAT_NAME,
+            "version": MANIFEST_FORMAT_VERSION,
+            "limits": {"samples": self.max_samples, "bytes": self.max_bytes, "seconds": self.max_seconds},
+            "metadata": self.metadata,
+            "segments": self.segments,
+        }
+        # Replace the manifest in one step so a reader never sees a half-written file
+        temp_path = self.manifest_file + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, self.manifest_file)
+
+    def _segment_full(self):
+        if self.segment["samples"] == 0:
+            return False
+        if self.max_samples and self.segment["samples"] >= self.max_samples:
+            return True
+        if self.max_bytes and self.sink.bytes_written >= self.max_bytes:
+            return True
+        if self.max_seconds and time.monotonic() - self._segment_started >= self.max_seconds:
+            return True
+        return False
+
+    def set_metadata(self, metadata):
+        self.metadata = dict(metadata)
+        self.sink.set_metadata(self._segment_metadata())
+        self._write_manifest()
+
+    def write_block(self, block):
+        start = 0
+        while start < block.count:
+            if self._segment_full():
+                self._close_segment()
+                self._open_segment(block.first_sample + start)
+            stop = block.count
+            if self.max_samples:
+                stop = min(stop, start + self.max_samples - self.segment["samples"])
+            self.sink.write_block(block if start == 0 and stop == block.count else BlockSlice(block, start, stop))
+            self.segment["samples"] += stop - start
+            self.segment["bytes"] = self.sink.bytes_written
+            start = stop
+
+    def close(self):
+        self._close_segment()
+        self._write_manifest()
+
+
+def read_manifest(filename):
+    """Load a segment manifest (the manifest path or the base filename of the recording may be given).
+    Returns the manifest dict; segment file names in it are made absolute.
+    """
+    if not filename.endswith(".manifest.json"):
+        filename = manifest_path(filename)
+    with open(filename) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != MANIFEST_FORMAT_NAME:
+        raise ValueError(f"{filename} is not a {MANIFEST_FORMAT_NAME} manifest")
+    directory = os.path.dirname(os.path.abspath(filename))
+    for segment in manifest["segments"]:
+        segment["path"] = os.path.join(directory, segment["file"])
+    return manifest
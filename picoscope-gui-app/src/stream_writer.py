@@ -0,0 +1,143 @@
+import csv
+import io
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+
+from raw_capture import sidecar_path
+
+log = logging.getLogger(__name__)
+
+CSV_FORMAT_NAME = "picoscope-csv"
+CSV_FORMAT_VERSION = 1
+
+
+def write_csv_sidecar(filename, header, metadata):
+    """Write the JSON file that accompanies a CSV capture: the capture metadata (start time, sample interval, ...)
+    and the column layout. Sample times can be derived from it even when the CSV has no time column.
+    """
+    metadata = dict(metadata)
+    metadata.update({
+        "format": CSV_FORMAT_NAME,
+        "version": CSV_FORMAT_VERSION,
+        "data_file": os.path.basename(filename),
+        "columns": list(header),
+    })
+    with open(sidecar_path(filename), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+
+class CsvSink:
+    """Writes converted blocks to a CSV file.
+    convert is called with a RingBlock and must return the columns for that block in header order.
+    """
+    def __init__(self, filename, header, convert):
+        self.filename = filename
+        self.header = header
+        self.convert = convert
+        self.bytes_written = 0
+        self.csvfile = open(filename, mode='w', newline='')
+        self.csvwriter = csv.writer(self.csvfile)
+        self.csvwriter.writerow(header)
+
+    def set_metadata(self, metadata):
+        write_csv_sidecar(self.filename, self.header, metadata)
+
+    def write_block(self, block):
+        columns = self.convert(block)
+        self.csvwriter.writerows(zip(*[column.tolist() for column in columns]))
+        self.csvfile.flush()
+        self.bytes_written = self.csvfile.tell()
+
+    def close(self):
+        if self.csvfile:
+            self.csvfile.close()
+            self.csvfile = None
+            self.csvwriter = None
+
+
+class BlockCsvSink:
+    """Writes CSV a whole block at a time. encode is called with a RingBlock and must return the block's rows
+    as bytes (see csv_encoder.encode_rows); the header is written with the csv module, like CsvSink's.
+    """
+    def __init__(self, filename, header, encode):
+        self.filename = filename
+        self.header = header
+        self.encode = encode
+        self.csvfile = open(filename, mode='wb')
+        text = io.StringIO()
+        csv.writer(text).writerow(header)
+        self.csvfile.write(text.getvalue().encode())
+        self.bytes_written = self.csvfile.tell()
+
+    def set_metadata(self, metadata):
+        write_csv_sidecar(self.filename, self.header, metadata)
+
+    def write_block(self, block):
+        self.csvfile.write(self.encode(block))
+        self.csvfile.flush()
+        self.bytes_written = self.csvfile.tell()
+
+    def close(self):
+        if self.csvfile:
+            self.csvfile.close()
+            self.csvfile = None
+
+
+class StreamWriter(threading.Thread):
+    """Drains a BlockRing on its own thread and hands each block to an output sink.
+    Keeps disk stalls away from the thread that polls the driver.
+    """
+    def __init__(self, ring, sink, poll_timeout=0.5, stats=None):
+        super().__init__(name="StreamWriter", daemon=True)
+        self.ring = ring
+        self.sink = sink
+        self.stats = stats  # optional telemetry.AcquisitionStats
+        self.poll_timeout = poll_timeout
+        self.blocks_written = 0
+        self.samples_written = 0
+        self.error = None
+
+    def run(self):
+        try:
+            while True:
+                block = self.ring.pop(timeout=self.poll_timeout)
+                if block is None:
+                    if self.ring.closed:
+                        break
+                    continue
+                try:
+                    bytes_before = self.sink.bytes_written
+                    started = time.perf_counter()
+                    self.sink.write_block(block)
+                    duration = time.perf_counter() - started
+                    self.blocks_written += 1
+                    self.samples_written += block.count
+                    if self.stats is not None:
+                        self.stats.record_write(block.count, self.sink.bytes_written - bytes_before, duration)
+                finally:
+                    self.ring.release(block)
+        except Exception as e:
+            self.error = e
+            # Stop accepting data so the callback never waits on a writer that is gone
+            self.ring.close()
+            log.exception("Error in output writer")
+            log_path = os.path.join(os.getcwd(), "picoscope_crash.log")
+            with open(log_path, "a") as f:
+                f.write("=== Crash Detected in StreamWriter ===\n")
+                traceback.print_exc(file=f)
+        finally:
+            # Sinks that buffer (e.g. compression) may still write when closed
+            bytes_before = self.sink.bytes_written
+            started = time.perf_counter()
+            self.sink.close()
+            if self.stats is not None:
+                self.stats.record_write(0, self.sink.bytes_written - bytes_before, time.perf_counter() - started)
+
+    def finish(self, timeout=None):
+        """Let the writer drain whatever is queued, then wait for it to exit."""
+        self.ring.close()
+        self.join(timeout)
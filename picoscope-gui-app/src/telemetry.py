@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import deque
+
+# Callback latency histogram: bucket i counts callbacks that took less than 2**i microseconds
+LATENCY_BUCKETS = 24  # the last bucket collects everything from ~8 s up
+
+
+class AcquisitionStats:
+    """Counters for one acquisition session, updated from the driver callback and writer threads.
+    snapshot() returns a consistent copy that the GUI and logs can read at any time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, channels=(), sample_interval_ns=None, ring=None):
+        """Start a new session. ring, if given, is the BlockRing feeding the writer (for queue depth and drops)."""
+        with self._lock:
+            self.channels = list(channels)
+            self.sample_interval_ns = sample_interval_ns
+            self.ring = ring
+            self.start_time = time.perf_counter()
+            self.callbacks = 0
+            self.samples = 0
+            self.samples_written = 0
+            self.bytes_written = 0
+            self.write_seconds = 0.0
+            self.overflow_callbacks = {ch: 0 for ch in "ABCD"}
+            self.latency_histogram = [0] * LATENCY_BUCKETS
+            self.latency_total = 0.0
+            self.latency_max = 0.0
+            self._history = deque(maxlen=64)  # (time, samples) pairs for the recent rate
+            self._extra = {}
+
+    def set_sample_interval(self, sample_interval_ns):
+        with self._lock:
+            self.sample_interval_ns = sample_interval_ns
+
+    def record_callback(self, samples, duration, overflow=0):
+        """Called at the end of every driver callback; duration is the time spent inside it, in seconds."""
+        now = time.perf_counter()
+        with self._lock:
+            self.callbacks += 1
+            self.samples += samples
+            if overflow:
+                for bit, ch in enumerate("ABCD"):
+                    if overflow & (1 << bit):
+                        self.overflow_callbacks[ch] += 1
+            bucket = min(int(duration * 1e6).bit_length(), LATENCY_BUCKETS - 1)
+            self.latency_histogram[bucket] += 1
+            self.latency_total += duration
+            self.latency_max = max(self.latency_max, duration)
+            if not self._history or now - self._history[-1][0] >= 0.1:
+                self._history.append((now, self.samples))
+
+    def record_write(self, samples, num_bytes, duration=0.0):
+        """Called by the writer thread after each block reaches the output; duration is the time the sink took to
+        convert and write it, in seconds."""
+        with self._lock:
+            self.samples_written += samples
+            self.bytes_written += num_bytes
+            self.write_seconds += duration
+
+    def set_extra(self, name, value):
+        """Attach a named value (e.g. poller or compressor metrics) that is included in every snapshot."""
+        with self._lock:
+            self._extra[name] = value
+
+    def _latency_percentile(self, fraction):
+        # Upper edge (seconds) of the histogram bucket that holds the given fraction of callbacks
+        target = fraction * self.callbacks
+        running = 0
+        for bucket, count in enumerate(self.latency_histogram):
+            running += count
+            if count and running >= target:
+                return (1 << bucket) * 1e-6
+        return 0.0
+
+    def snapshot(self):
+        """Thread-safe copy of all counters plus derived rates."""
+        now = time.perf_counter()
+        with self._lock:
+            elapsed = now - self.start_time
+            recent_rate = 0.0
+            if len(self._history) >= 2:
+                (t0, s0), (t1, s1) = self._history[0], self._history[-1]
+                if t1 > t0:
+                    recent_rate = (s1 - s0) / (t1 - t0)
+            lag_samples = None
+            if self.sample_interval_ns:
+                # Samples the scope has produced by now that we have not received yet
+                lag_samples = max(0, int(elapsed * 1e9 / self.sample_interval_ns) - self.samples)
+            ring = self.ring
+            snapshot = {
+                "elapsed_s": elapsed,
+                "callbacks": self.callbacks,
+                "samples": self.samples,
+                "samples_written": self.samples_written,
+                "bytes_written": self.bytes_written,
+                "write_busy_s": self.write_seconds,
+                "sample_rate": self.samples / elapsed if elapsed > 0 else 0.0,
+                "recent_sample_rate": recent_rate,
+                "lag_samples": lag_samples,
+                "overflow_callbacks": {ch: self.overflow_callbacks[ch] for ch in self.channels},
+                "callback_latency_histogram": list(self.latency_histogram),
+                "callback_latency_mean_s": self.latency_total / self.callbacks if self.callbacks else 0.0,
+                "callback_latency_p99_s": self._latency_percentile(0.99),
+                "callback_latency_max_s": self.latency_max,
+                "queue_depth": ring.depth if ring is not None else 0,
+                "queue_max_depth": ring.max_depth if ring is not None else 0,
+                "queue_capacity": ring.capacity if ring is not None else 0,
+                "dropped_blocks": ring.dropped_blocks if ring is not None else 0,
+                "dropped_samples": ring.dropped_samples if ring is not None else 0,
+            }
+            snapshot.update(self._extra)
+        return snapshot
+
+
+def format_snapshot(snapshot):
+    """One-line summary of a snapshot for the console log and the GUI status label."""
+    text = (f"{snapshot['recent_sample_rate'] / 1e3:.1f} kS/s, {snapshot['samples']} samples, "
+            f"{snapshot['bytes_written'] / 2**20:.1f} MB written, "
+            f"queue {snapshot['queue_depth']}/{snapshot['queue_capacity']}, "
+            f"callback p99 {snapshot['callback_latency_p99_s'] * 1e3:.2f} ms")
+    polling = snapshot.get("polling")
+    if polling:
+        text += f", polling every {polling['poll_period_s'] * 1e3:.1f} ms"
+    compression = snapshot.get("compression")
+    if compression and compression["compressed_bytes"]:
+        text += f", {compression['codec']} {compression['ratio']:.1f}x ({compression['cpu_s']:.1f} s CPU)"
+    if snapshot["lag_samples"]:
+        text += f", behind by {snapshot['lag_samples']} samples"
+    if snapshot["dropped_samples"]:
+        text += f", DROPPED {snapshot['dropped_samples']} samples"
+    overflowed = [ch for ch, count in snapshot["overflow_callbacks"].items() if count]
+    if overflowed:
+        text += f", over-range on {','.join(overflowed)}"
+    return text
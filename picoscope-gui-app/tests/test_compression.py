@@ -0,0 +1,70 @@
+"""Round trip of compressed raw captures: blocks written by CompressedRawSink read back unchanged by open_capture."""
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+from compression import CompressedRawSink  # noqa: E402
+from raw_capture import open_capture  # noqa: E402
+from ring_buffer import RingBlock  # noqa: E402
+
+BLOCK_SIZE = 1000
+# the last block is cut short, with an odd number of samples
+BLOCK_COUNTS = [BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE, 437]
+ANALOG = ["A", "B"]
+DIGITAL_PORTS = 2
+
+
+def write_capture(filename, block_filter, with_min):
+    """Write random blocks to a compressed capture. Returns the records they hold, built independently."""
+    rng = np.random.default_rng(16)
+    num_min = len(ANALOG) if with_min else 0
+    sink = CompressedRawSink(filename, ANALOG, DIGITAL_PORTS, BLOCK_SIZE, with_min=with_min,
+                             block_filter=block_filter)
+    sink.set_metadata({"channel_order": ANALOG})
+    expected = np.zeros(sum(BLOCK_COUNTS), dtype=sink.dtype)
+    first = 0
+    for count in BLOCK_COUNTS:
+        block = RingBlock(0, BLOCK_SIZE, len(ANALOG), DIGITAL_PORTS, num_min, DIGITAL_PORTS if with_min else 0)
+        block.first_sample = first
+        block.count = count
+        block.analog[:] = rng.integers(-32768, 32768, block.analog.shape)
+        block.analog_min[:] = rng.integers(-32768, 32768, block.analog_min.shape)
+        block.digital[:] = rng.integers(0, 256, block.digital.shape)
+        block.digital_min[:] = rng.integers(0, 256, block.digital_min.shape)
+        records = expected[first:first + count]
+        for row, channel in enumerate(ANALOG):
+            records[channel] = block.analog[row, :count]
+            if with_min:
+                records[f"{channel}_min"] = block.analog_min[row, :count]
+        for port in range(DIGITAL_PORTS):
+            records[f"PORT{port}"] = block.digital[port, :count]
+            if with_min:
+                records[f"PORT{port}_min"] = block.digital_min[port, :count]
+        sink.write_block(block)
+        first += count
+    sink.close()
+    return expected
+
+
+@pytest.mark.parametrize("with_min", [False, True], ids=["plain", "aggregate"])
+@pytest.mark.parametrize("block_filter", [None, "byteshuffle", "bitshuffle"])
+def test_compressed_round_trip(tmp_path, block_filter, with_min):
+    filename = str(tmp_path / "capture.bin")
+    expected = write_capture(filename, block_filter, with_min)
+
+    data, metadata = open_capture(filename)
+    assert metadata["compression"]["filter"] == block_filter
+    assert data.dtype == expected.dtype
+    assert len(data) == len(expected)
+    np.testing.assert_array_equal(data[:], expected)
+    # slices which cross frame boundaries, with and without a step, and the odd-length last frame
+    np.testing.assert_array_equal(data[BLOCK_SIZE - 7:BLOCK_SIZE + 9], expected[BLOCK_SIZE - 7:BLOCK_SIZE + 9])
+    np.testing.assert_array_equal(data[995:2 * BLOCK_SIZE + 13:3], expected[995:2 * BLOCK_SIZE + 13:3])
+    np.testing.assert_array_equal(data[3 * BLOCK_SIZE - 1:], expected[3 * BLOCK_SIZE - 1:])
+    assert data[-1] == expected[-1]
@@ -0,0 +1,33 @@
+"""Import smoke test: device.py and library.py are copies of picosdk modules, so they must import as picosdk.*."""
+import importlib
+import os
+import shutil
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# the modules of src/ which also exist in the picosdk package; app modules such as scaling.py do not.
+PICOSDK_MODULES = ["constants.py", "errors.py", "device.py", "library.py"]
+
+pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def picosdk_from_src(tmp_path, monkeypatch):
+    """Make `picosdk` resolve to a package holding only the copies in src/, instead of any installed package."""
+    package = tmp_path / "picosdk"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    for name in PICOSDK_MODULES:
+        shutil.copy(os.path.join(SRC, name), package / name)
+    for name in list(sys.modules):
+        if name == "picosdk" or name.startswith("picosdk."):
+            monkeypatch.delitem(sys.modules, name)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+
+@pytest.mark.parametrize("module", ["picosdk.device", "picosdk.library"])
+def test_picosdk_copies_import(picosdk_from_src, module):
+    importlib.import_module(module)